@@ -0,0 +1,50 @@
+# encoding=utf-8
+import multiprocessing
+import sys
+
+import jamen_utils
+from jamen_cutter import JamenCutter, logger
+
+# 预派生工作进程的内存测试：父进程预加载词典后派生工作进程，
+# 统计每个工作进程完成切分后的常驻内存增长与独占内存，对比不预加载、由工作进程各自加载词典的情况
+
+
+def run_worker(text, queue):
+    rss, private = jamen_utils.get_rss(), jamen_utils.get_private_memory()
+    cutter = JamenCutter()
+    for line in text.splitlines():
+        list(cutter.cut_with_prop(line))
+    list(cutter.extract_names(text))
+    queue.put((jamen_utils.get_rss() - rss, jamen_utils.get_private_memory() - private))
+
+
+def measure(text, workers):
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    processes = [context.Process(target=run_worker, args=(text, queue)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return results
+
+
+def report(title, results):
+    for i, (rss, private) in enumerate(results):
+        logger.info(f"{title} worker {i}: rss growth: {rss / 1048576:.1f}MB, private growth: {private / 1048576:.1f}MB")
+    return max(private for rss, private in results)
+
+
+if __name__ == '__main__':
+    book_path = sys.argv[1] if len(sys.argv) > 1 else 'res/材料帝国1.txt'
+    workers = 4
+    text = jamen_utils.load_text(book_path)[:200000]
+
+    cold = report('cold', measure(text, workers))
+
+    JamenCutter().preload()
+    warm = report('preload', measure(text, workers))
+
+    logger.info(f"max private growth per worker, cold: {cold / 1048576:.1f}MB, preload: {warm / 1048576:.1f}MB")
+    assert warm <= cold, "preloaded workers should not use more private memory than cold ones"
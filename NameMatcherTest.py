@@ -0,0 +1,125 @@
+# encoding=utf-8
+import random
+import sys
+
+import jamen_utils
+from chinese_name_matcher import ChineseNameMatcher
+from double_array_trie import DoubleArrayTrie
+from jamen_cutter import JamenCutter, logger
+
+# 姓名匹配自动机的等价性测试：用逐段嵌套生成器的原始实现作为参照，
+# 对随机拼接的姓名组成部分与夹杂的普通字，逐一比较整段匹配的权重与从各起点匹配出的所有姓名结束位置。
+# 匹配自动机只报告正权重的姓名，不是姓名的权重统一按0比较
+
+
+def load_part_dict(dict_path):
+    """按原始实现加载组成部分词典：重复词取最高权重，并补入权重为0的前缀词"""
+    words = {}
+    for word, weight, prop in jamen_utils.iter_dict(dict_path):
+        if weight > words.get(word, (0, ''))[0]:
+            words[word] = weight, prop
+            for i in range(1, len(word)):
+                if word[:i] not in words:
+                    words[word[:i]] = 0, ''
+    return words
+
+
+def match_prefix_dict(str, prefix_dict, begin=0):
+    for end in range(begin + 1, len(str) + 1):
+        tmp = str[begin:end]
+        x, prop = prefix_dict.get(tmp, (-1, ''))
+        if x >= 0:
+            yield tmp, x
+        if x < 0:
+            break
+    yield '', 1
+
+
+def match_chinese_name(str, prefixes, family_names, given_names, suffixes):
+    """原始的逐段匹配实现"""
+    max_weight = -1
+    n = len(str)
+    for name_prefix, name_prefix_weight in match_prefix_dict(str, prefixes, 0):
+        i = len(name_prefix)
+
+        for family_name, family_name_weight in match_prefix_dict(str, family_names, i):
+            j = i + len(family_name)
+            if j == n:
+                max_weight = max(max_weight, name_prefix_weight + family_name_weight)
+                continue
+            elif family_name_weight == 0:
+                continue
+            elif name_prefix and family_name:
+                continue
+
+            for given_name, given_name_weight in match_prefix_dict(str, given_names, j):
+                if name_prefix and not family_name and len(given_name) > 1:
+                    continue
+
+                k = j + len(given_name)
+                if k == n:
+                    max_weight = max(max_weight, name_prefix_weight + family_name_weight + given_name_weight)
+                    continue
+                elif given_name_weight == 0:
+                    continue
+
+                if name_prefix and family_name:
+                    continue
+                elif given_name:
+                    continue
+                else:
+                    for name_suffix, suffix_weight in match_prefix_dict(str, suffixes, k):
+                        m = k + len(name_suffix)
+                        if m == n:
+                            max_weight = max(max_weight, name_prefix_weight +
+                                             family_name_weight + given_name_weight + suffix_weight)
+
+    if max_weight > 0:
+        max_weight = max(max_weight, 10)
+    if len(str) == 1:
+        max_weight = min(max_weight, 1)
+    return max_weight
+
+
+def random_part_dict(alphabet):
+    """随机的小词典，多字词的前缀词权重为0，覆盖真实词典中少见的组合"""
+    words = {}
+    for _ in range(random.randint(0, 6)):
+        word = ''.join(random.choice(alphabet) for _ in range(random.randint(1, 3)))
+        weight = random.randint(1, 20)
+        if weight > words.get(word, (0, ''))[0]:
+            words[word] = weight, 'x'
+            for i in range(1, len(word)):
+                if word[:i] not in words:
+                    words[word[:i]] = 0, ''
+    return words
+
+
+def check(parts, pieces, rounds):
+    matcher = ChineseNameMatcher(*[DoubleArrayTrie.build({word: (weight,) for word, (weight, prop) in part.items()})
+                                   for part in parts])
+    for _ in range(rounds):
+        text = ''.join(random.choice(random.choice(pieces)) for _ in range(random.randint(1, 4)))[:8]
+        for begin in range(len(text)):
+            names = matcher.match(text, begin)
+            for end in range(begin + 1, len(text) + 1):
+                expected = match_chinese_name(text[begin:end], *parts)
+                actual = names.get(end, -1)
+                assert max(expected, 0) == max(actual, 0), \
+                    f"'{text[begin:end]}' in '{text}': expected {expected}, got {actual}"
+        assert max(match_chinese_name(text, *parts), 0) == max(matcher.match_whole(text), 0), text
+
+
+if __name__ == '__main__':
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    random.seed(20261017)
+
+    parts = [load_part_dict(dict_path) for dict_path in JamenCutter.CHINESE_NAME_DICT_PATH_LIST]
+    check(parts, [sorted(part) for part in parts] + [list('的了是在不我他说这个')], rounds)
+    logger.info(f"name matcher matches the nested-generator matcher on {rounds} random strings")
+
+    alphabet = 'abcde'
+    for _ in range(rounds // 50):
+        parts = [random_part_dict(alphabet) for _ in range(4)]
+        check(parts, [list(alphabet)], 50)
+    logger.info(f"name matcher matches the nested-generator matcher on {rounds // 50} random dict sets")
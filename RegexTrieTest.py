@@ -0,0 +1,64 @@
+# encoding=utf-8
+import random
+import re
+import sys
+
+import regex_trie
+from jamen_cutter import JamenCutter, logger
+
+# 字典树正则式的等价性测试：以 '|'.join 逐一拼接的原始正则式作为参照，
+# 在随机文本的每个位置比较两者匹配到的内容，并比较 split 的结果。
+# 先用 data/not_included_regexps.txt 中的正则式，再用随机生成的正则式片段，覆盖字符集、可选、量词与多分支的组合
+
+
+def check(patterns, texts):
+    expected_regex = re.compile(f"({'|'.join(patterns)})", re.U)
+    actual_regex = regex_trie.compile_patterns(patterns, group=True)
+    for text in texts:
+        for pos in range(len(text)):
+            expected = expected_regex.match(text, pos)
+            actual = actual_regex.match(text, pos)
+            assert (expected and expected.group()) == (actual and actual.group()), \
+                f"{patterns} at {pos} of '{text}': expected {expected}, got {actual}"
+        assert expected_regex.split(text) == actual_regex.split(text), f"{patterns} split '{text}'"
+
+
+def random_atom(alphabet):
+    kind = random.random()
+    if kind < 0.5:
+        atom = random.choice(alphabet)
+    elif kind < 0.8:
+        atom = f"[{''.join(random.sample(alphabet, random.randint(1, len(alphabet))))}]"
+    elif kind < 0.9:
+        atom = random.choice(['[a-c]', '[^ab]', '[\\w.]', '\\.', '.', '\\S'])
+    else:
+        atom = f"(?:{random_alternative(alphabet, 2)})"
+    return atom + random.choice(['', '', '', '?', '?', '+', '*', '??'])
+
+
+def random_alternative(alphabet, max_atoms=4):
+    return ''.join(random_atom(alphabet) for _ in range(random.randint(1, max_atoms)))
+
+
+def random_pattern(alphabet):
+    return '|'.join(random_alternative(alphabet) for _ in range(random.choice([1, 1, 1, 2, 3])))
+
+
+def random_text(alphabet, length):
+    return ''.join(random.choice(alphabet) for _ in range(length))
+
+
+if __name__ == '__main__':
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    random.seed(20261017)
+
+    patterns = regex_trie.load_patterns(JamenCutter.NOT_INCLUDED_REGEX_PATH)
+    alphabet = sorted(set(''.join(patterns)) - set('.^$*+?{}[]\\|()')) + list('秦海宁默说道')
+    check(patterns, [random_text(alphabet, random.randint(1, 12)) for _ in range(rounds // 10)])
+    logger.info(f"regex trie matches the joined regex of '{JamenCutter.NOT_INCLUDED_REGEX_PATH}'")
+
+    alphabet = 'abcd.'
+    for _ in range(rounds):
+        patterns = [random_pattern(alphabet) for _ in range(random.randint(1, 6))]
+        check(patterns, [random_text(alphabet, random.randint(1, 8)) for _ in range(5)])
+    logger.info(f"regex trie matches the joined regex on {rounds} random pattern sets")
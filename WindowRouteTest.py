@@ -0,0 +1,47 @@
+# encoding=utf-8
+import re
+import sys
+
+import jamen_utils
+from jamen_cutter import JamenCutter, logger
+
+# 分段窗口切分的等价性测试：超长中文片段按窗口分段切分的结果须与整段切分完全一致。
+# 用去掉标点的整本书作为一个超长片段，窗口取多个大小，其中包括小于词典最长词的窗口（会被放大到最长词长）；
+# 另用“来来来…”、“哈哈哈…”之类的重复字，分数在误差内相同的路径很多，检查平局取较长的词，不受窗口位置影响；
+# 重复字的窗口内没有可以提交的位置，测试的是这一分支
+
+WINDOWS = [4, 8, 16, 64, 256]
+"""要测试的窗口大小"""
+
+
+def cut_whole(text):
+    return list(JamenCutter(clip_cache_size=0).cut_with_prop(text))
+
+
+def check(text, windows, title):
+    expected = cut_whole(text)
+    for window in windows:
+        actual = list(JamenCutter(clip_cache_size=0, route_window=window).cut_with_prop(text))
+        diffs = [(e, a) for e, a in zip(expected, actual) if e != a][:5]
+        assert actual == expected, f"{title}, window {window}: {len(expected)} vs {len(actual)} tokens, {diffs}"
+
+
+if __name__ == '__main__':
+    book_path = sys.argv[1] if len(sys.argv) > 1 else 'res/材料帝国1.txt'
+    max_chars = int(sys.argv[2]) if len(sys.argv) > 2 else 60000
+
+    # 重复字的平局：来 + 来来来 与 来来来 + 来 的分数在数学上相等，取首词较长的
+    assert [word for word, prop in cut_whole('来来来来')] == ['来来来', '来'], cut_whole('来来来来')
+
+    # 重复字处处有边跨过，最佳路径取决于片段全长，只有不超过 2 倍窗口的片段分段切分才与整段切分一致
+    window_sizes = {window: JamenCutter(route_window=window)._route_window_size() for window in WINDOWS}
+    for ch in '来哈铃':
+        for n in list(range(1, 40)) + [63, 64, 65, 127, 128, 129, 255, 256, 257, 511, 512]:
+            check(ch * n, [window for window in WINDOWS if n <= 2 * window_sizes[window]], f"'{ch}' * {n}")
+    text = '来来来哈哈哈铃铃' * 60
+    check(text, [window for window in WINDOWS if len(text) <= 2 * window_sizes[window]], 'mixed repeated chars')
+    logger.info(f"windowed routes match whole-clip routes on repeated-char runs, windows: {WINDOWS}")
+
+    text = ''.join(re.findall('[\u4E00-\u9FD5]+', jamen_utils.load_text(book_path)))[:max_chars]
+    check(text, WINDOWS, book_path)
+    logger.info(f"windowed routes match whole-clip routes on {len(text)} chars of '{book_path}', windows: {WINDOWS}")
@@ -0,0 +1,73 @@
+"""
+多模式匹配自动机
+"""
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick 多模式匹配自动机
+
+    一组词构建一次，之后对任意文本自左向右扫描一遍，即可列举出所有词在文本中的每一次出现，
+    只访问真实出现的词，不必枚举文本的所有子串再逐一查表
+    """
+
+    def __init__(self, words):
+        """
+        :param words: 词的可迭代对象，重复的词只收录一次
+        """
+        self._goto = [{}]
+        """结点 -> {字符: 子结点}"""
+        self._fail = [0]
+        """失配时跳转的结点，即当前结点所表示字符串的最长真后缀结点"""
+        self._lengths = [0]
+        """结点为词尾时的词长，否则为0"""
+        self._outputs = [0]
+        """沿失配链最近的词尾结点，不存在则为0"""
+        self.size = 0
+
+        for word in words:
+            node = 0
+            for ch in word:
+                child = self._goto[node].get(ch)
+                if child is None:
+                    child = self._goto[node][ch] = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._lengths.append(0)
+                    self._outputs.append(0)
+                node = child
+            if word and not self._lengths[node]:
+                self._lengths[node] = len(word)
+                self.size += 1
+
+        # 按层序计算失配链接，父结点总先于子结点处理
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for ch, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(ch, 0)
+                self._fail[child] = fail
+                self._outputs[child] = fail if self._lengths[fail] else self._outputs[fail]
+                queue.append(child)
+
+    def __len__(self):
+        return self.size
+
+    def finditer(self, text):
+        """
+        列举出所有词在文本中的出现
+        :param text: 文本
+        :return: (开始位置, 结束位置) 的迭代器，结束位置不含，按结束位置升序，结束位置相同时长词在前
+        """
+        goto, fail, lengths, outputs = self._goto, self._fail, self._lengths, self._outputs
+        node = 0
+        for end, ch in enumerate(text, 1):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            match = node if lengths[node] else outputs[node]
+            while match:
+                yield end - lengths[match], end
+                match = outputs[match]
@@ -0,0 +1,235 @@
+# encoding=utf-8
+"""
+性能基准测试
+
+以 res/材料帝国1.txt 及其放大若干倍的文本为输入，测试各阶段的耗时、吞吐量（字/秒）与峰值内存，
+jieba 的 cut 作为参照（未安装则跳过）。每次测量都在独立的子进程中进行，互不影响缓存与内存统计。
+
+用法：
+    python benchmark.py                          # 运行并与基线比较，有阶段退化超过阈值时以1退出，基线不存在时以2退出
+    python benchmark.py --save-baseline          # 运行并保存为基线
+基线与机器相关，不纳入版本库，须先在本机运行 --save-baseline 生成
+    python benchmark.py --scales 1,4,16 --repeat 3 --stages cut_with_prop,extract_names
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import jamen_utils
+
+logging.basicConfig(
+    stream=sys.stderr,
+    level=logging.DEBUG,
+    format='%(asctime)s.%(msecs)03d %(filename)s: %(levelname)s %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_BOOK_PATH = 'res/材料帝国1.txt'
+DEFAULT_BASELINE_PATH = 'benchmark_baseline.json'
+REFERENCE_STAGES = {'jieba_cut'}
+"""参照阶段，只报告，不参与退化判断"""
+MIN_REGRESSION_SECONDS = 0.05
+"""耗时增量小于此值时视为测量噪声，不算退化"""
+CLIP_CACHE_SIZE = 0
+"""切分器的片段缓存大小。放大的文本是原文的重复，开着缓存时重复部分全部命中，测不出真实的切分速度"""
+
+
+def _stage_init_cold(text):
+    from jamen_cutter import JamenCutter
+    JamenCutter.COMPILED_DICT_PATH = None
+    JamenCutter.CACHE_DIR = tempfile.mkdtemp(prefix='jamen_bench_')
+    atexit.register(shutil.rmtree, JamenCutter.CACHE_DIR, True)
+    return lambda: _load_all_dicts(JamenCutter())
+
+
+def _stage_init_warm(text):
+    from jamen_cutter import JamenCutter
+    _load_all_dicts(JamenCutter())  # 确保缓存已生成
+    JamenCutter._dict_groups.clear()
+    return lambda: _load_all_dicts(JamenCutter())
+
+
+def _load_all_dicts(cutter):
+    for group in ('words', 'names', 'regex'):
+        cutter._get_dict_group(group)
+
+
+def _stage_cut_with_prop(text):
+    from jamen_cutter import JamenCutter
+    cutter = JamenCutter(clip_cache_size=CLIP_CACHE_SIZE)
+    _load_all_dicts(cutter)
+    return lambda: list(cutter.cut_with_prop(text))
+
+
+def _stage_extract_names(text):
+    from jamen_cutter import JamenCutter
+    cutter = JamenCutter(clip_cache_size=CLIP_CACHE_SIZE)
+    _load_all_dicts(cutter)
+    return lambda: list(cutter.extract_names(text))
+
+
+def _stage_tag_analyse(text):
+    from tag_analyzer import TagAnalyzer
+    analyzer = TagAnalyzer()
+    return lambda: analyzer.analyse(text)
+
+
+def _stage_story_analyse(text):
+    from story_teller import StoryTeller
+    teller = StoryTeller()
+    teller.name_cutter.clip_cache_size = CLIP_CACHE_SIZE
+    _load_all_dicts(teller.name_cutter)
+    return lambda: teller.analyse(text)
+
+
+def _stage_jieba_cut(text):
+    import jieba
+    jieba.setLogLevel(logging.WARNING)
+    jieba.initialize()
+    return lambda: list(jieba.cut(text))
+
+
+STAGES = {
+    'init_cold': _stage_init_cold,
+    'init_warm': _stage_init_warm,
+    'cut_with_prop': _stage_cut_with_prop,
+    'extract_names': _stage_extract_names,
+    'tag_analyse': _stage_tag_analyse,
+    'story_analyse': _stage_story_analyse,
+    'jieba_cut': _stage_jieba_cut,
+}
+"""阶段名 -> 准备函数，准备函数接收输入文本，返回要计时的函数"""
+INIT_STAGES = {'init_cold', 'init_warm'}
+"""与文本无关的阶段，只在最小的放大倍数上测试"""
+
+
+def run_stage(stage, scale, book_path):
+    """
+    在当前进程中测量一个阶段
+    :return: {'chars': 字数, 'seconds': 秒数, 'peak_memory': 峰值内存字节数，无法获取时为0}，依赖缺失时为 {'skipped': 原因}
+    """
+    text = jamen_utils.load_text(book_path) * scale
+    try:
+        run = STAGES[stage](text)
+    except ImportError as e:
+        return {'skipped': str(e)}
+    begin_time = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - begin_time
+    return {'chars': 0 if stage in INIT_STAGES else len(text), 'seconds': seconds,
+            'peak_memory': jamen_utils.get_peak_rss()}
+
+
+def measure(stage, scale, book_path, repeat=1):
+    """
+    在独立的子进程中重复测量，耗时取最小值，峰值内存取最大值
+    """
+    result = None
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, __file__, '--child', stage, str(scale), book_path],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True, text=True).stdout
+        current = json.loads(output.strip().splitlines()[-1])
+        if 'skipped' in current:
+            return current
+        if result is None:
+            result = current
+        else:
+            result['seconds'] = min(result['seconds'], current['seconds'])
+            result['peak_memory'] = max(result['peak_memory'], current['peak_memory'])
+    return result
+
+
+def compare(results, baseline, threshold):
+    """
+    与基线比较
+    :return: 退化的说明列表
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base or 'skipped' in result or 'skipped' in base or key.split('@')[0] in REFERENCE_STAGES:
+            continue
+        if result['seconds'] > base['seconds'] * (1 + threshold) \
+                and result['seconds'] - base['seconds'] > MIN_REGRESSION_SECONDS:
+            regressions.append(f"{key}: time {base['seconds']:.3f}s -> {result['seconds']:.3f}s")
+        # 无法获取峰值内存的平台上记为0，不比较
+        if base['peak_memory'] and result['peak_memory'] > base['peak_memory'] * (1 + threshold):
+            regressions.append(f"{key}: peak memory {base['peak_memory'] / 1048576:.1f}MB -> "
+                               f"{result['peak_memory'] / 1048576:.1f}MB")
+    return regressions
+
+
+def print_report(results, baseline):
+    print(f"{'stage':<24}{'chars':>10}{'seconds':>10}{'chars/s':>12}{'peak MB':>10}{'vs base':>10}")
+    for key, result in results.items():
+        if 'skipped' in result:
+            print(f"{key:<24}skipped: {result['skipped']}")
+            continue
+        throughput = f"{result['chars'] / result['seconds']:.0f}" if result['chars'] and result['seconds'] else '-'
+        base = baseline.get(key)
+        ratio = f"{result['seconds'] / base['seconds']:.2f}x" if base and base.get('seconds') else '-'
+        print(f"{key:<24}{result['chars']:>10}{result['seconds']:>10.3f}{throughput:>12}"
+              f"{result['peak_memory'] / 1048576:>10.1f}{ratio:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JamenCutter 性能基准测试')
+    parser.add_argument('--book', default=DEFAULT_BOOK_PATH)
+    parser.add_argument('--scales', default='1,4', help='文本放大倍数，逗号分隔')
+    parser.add_argument('--stages', default=','.join(STAGES), help='要测试的阶段，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=3, help='每项测量的重复次数，耗时取最小值')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH, help='基线文件')
+    parser.add_argument('--threshold', type=float, default=0.2, help='耗时或峰值内存超出基线的比例上限')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线')
+    parser.add_argument('--child', nargs=3, metavar=('STAGE', 'SCALE', 'BOOK'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        stage, scale, book_path = args.child
+        print(json.dumps(run_stage(stage, int(scale), book_path)))
+        return 0
+
+    scales = [int(scale) for scale in args.scales.split(',')]
+    results = {}
+    for stage in args.stages.split(','):
+        if stage not in STAGES:
+            parser.error(f"unknown stage '{stage}'")
+        for scale in scales[:1] if stage in INIT_STAGES else scales:
+            logger.info(f"benchmark {stage} x{scale}...")
+            results[f"{stage}@{scale}"] = measure(stage, scale, args.book, args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='UTF-8') as file:
+            baseline = json.load(file)
+    print_report(results, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='UTF-8') as file:
+            json.dump({**baseline, **results}, file, ensure_ascii=False, indent=2)
+        logger.info(f"baseline saved into '{args.baseline}'")
+        return 0
+
+    if not baseline:
+        logger.error(f"baseline '{args.baseline}' not found, run with --save-baseline first")
+        return 2
+    missing = [key for key in results if key not in baseline]
+    if missing:
+        logger.warning(f"no baseline for {', '.join(missing)}, not compared")
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        logger.error(f"regression: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+# encoding=utf-8
+"""
+词典构建
+
+把任意多个源词典以外部排序归并的方式合并、去重，按词性过滤，归一化权重，
+输出 JamenCutter 可直接加载的二进制字典树，也可输出合并后的文本词典。
+各源词典先分块排序写入临时文件，再逐词归并，内存只与输出的词条数有关，
+源词典不必同时装入内存。重建词典因此成为一个离线步骤，不再在每个进程启动时进行。
+
+用法：
+    python build_dict.py                                   # 按 JamenCutter 的默认词典构建 dict/words.dat
+    python build_dict.py --words dict/jieba.dict --reference dict/chinese.dict \\
+        --drop-pos nr,nrt --text-output dict/jieba_without_nr.dict --output ''
+"""
+import argparse
+import heapq
+import itertools
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import time
+from array import array
+from math import log
+
+import jamen_utils
+from double_array_trie import DoubleArrayTrie
+
+logging.basicConfig(
+    stream=sys.stderr,
+    level=logging.DEBUG,
+    format='%(asctime)s.%(msecs)03d %(filename)s: %(levelname)s %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+RUN_SIZE = 200000
+"""每个排序分块的记录数"""
+_BATCH_SIZE = 1000
+"""分块文件中每次序列化的记录数"""
+
+WORD, NAME, REFERENCE = range(3)
+"""源词典的种类：普通词、外文人名、参照词典（只用来确认被过滤词性的词，本身不输出）"""
+
+
+def _iter_records(sources):
+    """
+    逐行读出各源词典的记录，排序键保证归并后同一个词的记录按决胜次序排列：
+    普通词权重高的在前，权重相同时先出现的在前；人名靠前的词典在前，同一词典中权重高的在前
+    :param sources: [(词典路径, 种类), ...]
+    :return: (词, 种类, 键1, 键2, 序号, 权重, 词性, 词典序号) 的迭代器
+    """
+    seq = 0
+    for index, (dict_path, kind) in enumerate(sources):
+        if not os.path.exists(dict_path):
+            logger.warning(f"dict['{dict_path}'] not found, skipped")
+            continue
+
+        logger.debug(f"read dict['{dict_path}']...")
+        for word, weight, prop in jamen_utils.iter_dict(dict_path):
+            if kind == NAME:
+                yield word, kind, index, -weight, seq, weight, prop, index
+            else:
+                yield word, kind, -weight, 0, seq, weight, prop, index
+            seq += 1
+
+
+def _sorted_runs(records, run_size, tmp_dir):
+    """
+    分块排序，每块写入一个临时文件
+    :return: 各块有序记录的迭代器列表
+    """
+    runs = []
+    while True:
+        chunk = sorted(itertools.islice(records, run_size))
+        if not chunk:
+            break
+        if not runs and len(chunk) < run_size:
+            # 只有一块，不必落盘
+            return [iter(chunk)]
+        fd, run_path = tempfile.mkstemp(suffix='.run', dir=tmp_dir)
+        with os.fdopen(fd, 'wb') as file:
+            for begin in range(0, len(chunk), _BATCH_SIZE):
+                pickle.dump(chunk[begin:begin + _BATCH_SIZE], file, pickle.HIGHEST_PROTOCOL)
+        runs.append(_read_run(run_path))
+        logger.debug(f"sorted run {len(runs)} written, records: {len(chunk)}")
+    return runs
+
+
+def _read_run(run_path):
+    with open(run_path, 'rb') as file:
+        while True:
+            try:
+                batch = pickle.load(file)
+            except EOFError:
+                break
+            yield from batch
+
+
+def merge_dicts(sources, drop_pos=(), retag_pos='n', run_size=RUN_SIZE):
+    """
+    归并源词典。普通词取权重最高的一条，权重相同时先出现的优先，权重不大于0的不收录；
+    外文人名取最靠前的词典中的权重。
+    词性在 drop_pos 中的普通词，只有单字或在其它普通词典、参照词典中也出现时才保留，并改标为 retag_pos。
+    来源掩码的第 k 位表示第 k 个源词典是以正权重收录此词的普通词典，只记录前31个源词典
+    :param sources: [(词典路径, 种类), ...]，种类为 WORD、NAME 或 REFERENCE
+    :param drop_pos: 要过滤的词性
+    :param retag_pos: 保留下来的被过滤词性改标的词性，为 None 时全部过滤
+    :param run_size: 每个排序分块的记录数
+    :return: 按词升序的 (词, 权重, 词性, 人名权重, 来源掩码) 迭代器，不是普通词时权重为0、词性为空
+    """
+    with tempfile.TemporaryDirectory(prefix='jamen_dict_') as tmp_dir:
+        runs = _sorted_runs(_iter_records(sources), run_size, tmp_dir)
+        for word, group in itertools.groupby(heapq.merge(*runs), key=lambda x: x[0]):
+            group = list(group)
+            word_weight, word_prop = 0, ''
+            for record in group:
+                weight, prop, index = record[5:]
+                if record[1] != WORD or weight <= 0:
+                    continue
+                if prop in drop_pos:
+                    if retag_pos is None or (len(word) > 1 and all(r[7] == index for r in group if r[1] != NAME)):
+                        continue
+                    prop = retag_pos
+                word_weight, word_prop = weight, prop
+                break
+
+            name_weight = next((r[5] for r in group if r[1] == NAME and r[5] > 0), 0)
+            if word_weight > 0 or name_weight > 0:
+                mask = source_mask(r[7] for r in group if r[1] == WORD and r[5] > 0)
+                yield word, word_weight, word_prop, name_weight, mask
+
+
+def source_mask(indexes):
+    """由源词典序号算出来源掩码，只记录前31个源词典"""
+    mask = 0
+    for index in indexes:
+        if index < 31:
+            mask |= 1 << index
+    return mask
+
+
+def _collect(items):
+    """
+    把归并结果按列存放
+    :return: (词列表, 权重数组, 词性编号数组, 人名权重数组, 来源掩码数组, 词性列表)
+    """
+    keys = []
+    weights, prop_ids, name_weights, source_masks = array('i'), array('i'), array('i'), array('i')
+    props = {'': 0}
+    for word, weight, prop, name_weight, mask in items:
+        keys.append(word)
+        weights.append(weight)
+        # 只统计普通词的词性
+        prop_ids.append(props.setdefault(prop, len(props)) if weight > 0 else 0)
+        name_weights.append(name_weight)
+        source_masks.append(mask)
+    return keys, weights, prop_ids, name_weights, source_masks, list(props)
+
+
+def _normalize(weights, total_weight):
+    """按比例缩放普通词的权重，使总权重约为 total_weight，收录的词权重至少为1"""
+    scale = total_weight / (sum(weights) or 1)
+    for i, weight in enumerate(weights):
+        if weight > 0:
+            weights[i] = max(1, round(weight * scale))
+
+
+def _compile(keys, weights, prop_ids, name_weights, source_masks, props):
+    """
+    构建 JamenCutter 的词典字典树，结点值依次为：词权重、词性编号、人名权重、词权重对数、人名权重对数、来源掩码，
+    词性按字母序编号，空词性为0
+    """
+    sorted_props = [''] + sorted(set(props) - {''})
+    remap = array('i', [sorted_props.index(prop) for prop in props])
+    fields = [
+        weights,
+        array('i', (remap[prop_id] for prop_id in prop_ids)),
+        name_weights,
+        array('d', (log(weight or 1) for weight in weights)),
+        array('d', (log(weight or 1) for weight in name_weights)),
+        source_masks,
+    ]
+    trie = DoubleArrayTrie.build_sorted(keys, fields, sorted_props)
+    trie.meta['total_weight'] = sum(weights)
+    return trie
+
+
+def compile_word_trie(items):
+    """
+    构建 JamenCutter 的词典字典树
+    :param items: 按词升序的 (词, 权重, 词性, 人名权重, 来源掩码) 迭代器
+    :return: 字典树
+    """
+    return _compile(*_collect(items))
+
+
+def write_text_dict(dict_path, keys, weights, prop_ids, props):
+    """把普通词写成“词 权重 词性”格式的文本词典"""
+    with open(dict_path, 'w', encoding='UTF-8') as file:
+        for word, weight, prop_id in zip(keys, weights, prop_ids):
+            if weight > 0:
+                file.write(f"{word} {weight} {props[prop_id]}\n")
+
+
+def build(sources, output=None, text_output=None, drop_pos=(), retag_pos='n', total_weight=None,
+          run_size=RUN_SIZE, layout_version=None):
+    """
+    构建词典
+    :param sources: [(词典路径, 种类), ...]
+    :param output: 二进制字典树的输出路径
+    :param text_output: 文本词典的输出路径
+    :param drop_pos: 要过滤的词性
+    :param retag_pos: 保留下来的被过滤词性改标的词性
+    :param total_weight: 归一化后的普通词总权重，None 表示不归一化
+    :param run_size: 每个排序分块的记录数
+    :param layout_version: 结点值布局的版本，写入字典树的附加信息，JamenCutter 据此判断能否直接加载。
+                           源词典列表也写入附加信息，其下标即来源掩码的位
+    :return: 收录的词条数
+    """
+    begin_time = time.perf_counter()
+    columns = _collect(merge_dicts(sources, drop_pos, retag_pos, run_size))
+    keys, weights, prop_ids, name_weights, source_masks, props = columns
+    logger.info(f"merge dicts done, entries: {len(keys)}, time cost: {time.perf_counter() - begin_time:.3f}s")
+    if total_weight:
+        _normalize(weights, total_weight)
+
+    if text_output:
+        write_text_dict(text_output, keys, weights, prop_ids, props)
+        logger.info(f"text dict written into '{text_output}'")
+    if output:
+        trie = _compile(*columns)
+        trie.meta['layout_version'] = layout_version
+        trie.meta['sources'] = [dict_path for dict_path, kind in sources]
+        trie.save(output)
+        logger.info(f"dict trie written into '{output}', nodes: {len(trie.check)}")
+    logger.info(f"build dict done, time cost: {time.perf_counter() - begin_time:.3f}s")
+    return len(keys)
+
+
+def main():
+    from jamen_cutter import JamenCutter
+
+    parser = argparse.ArgumentParser(description='构建 JamenCutter 词典')
+    parser.add_argument('--words', nargs='*', default=JamenCutter.WORD_DICT_PATH_LIST, help='普通词典')
+    parser.add_argument('--names', nargs='*', default=JamenCutter.NAME_DICT_PATH_LIST, help='外文人名词典，靠前的优先')
+    parser.add_argument('--reference', nargs='*', default=[], help='参照词典，只用来确认被过滤词性的词')
+    parser.add_argument('--output', default=JamenCutter.COMPILED_DICT_PATH, help="二进制字典树，'' 表示不输出")
+    parser.add_argument('--text-output', help='合并后的文本词典')
+    parser.add_argument('--drop-pos', default='', help='要过滤的词性，逗号分隔，如 nr,nrt')
+    parser.add_argument('--retag-pos', default='n', help='单字或被其它词典确认的被过滤词改标的词性')
+    parser.add_argument('--normalize', type=int, help='把普通词总权重归一化到此值')
+    parser.add_argument('--run-size', type=int, default=RUN_SIZE, help='每个排序分块的记录数')
+    args = parser.parse_args()
+
+    sources = [(dict_path, WORD) for dict_path in args.words] + \
+              [(dict_path, NAME) for dict_path in args.names] + \
+              [(dict_path, REFERENCE) for dict_path in args.reference]
+    drop_pos = {prop for prop in args.drop_pos.split(',') if prop}
+    build(sources, args.output, args.text_output, drop_pos, args.retag_pos, args.normalize, args.run_size,
+          JamenCutter._DICT_CACHE_VERSION)
+
+
+if __name__ == '__main__':
+    main()
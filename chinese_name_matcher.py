@@ -0,0 +1,151 @@
+"""
+中文姓名匹配自动机
+"""
+from jamen_profiler import profile
+
+
+class ChineseNameMatcher:
+    """
+    将“前缀 + 姓 + 名 + 后缀”的姓名规则编译成一个有限状态自动机，
+    从起始位置出发自左向右走一遍，即可报告所有合法的姓名结束位置及其权重。
+
+    规则与逐段匹配的实现一致：
+    - 各组成部分均可省略，省略的部分权重记为1
+    - 有前缀又有姓时，姓名到姓为止
+    - 姓后面还有字时，姓须是完整的姓（权重不为0）
+    - 只有前缀没有姓时，名只能是单字
+    - 有名时不再带后缀
+
+    自动机状态为非确定状态的集合，按需构造并缓存转移，相同的字符序列只构造一次
+    """
+
+    MAX_STATES = 100000
+    """缓存的状态数上限，超过后清空重建"""
+
+    _PREFIX, _FAMILY, _GIVEN, _SUFFIX = range(4)
+
+    def __init__(self, prefixes, family_names, given_names, suffixes):
+        """
+        :param prefixes: 前缀字典树，如“小”、“老”
+        :param family_names: 姓字典树
+        :param given_names: 名字典树
+        :param suffixes: 后缀字典树，如“哥”、“厂长”
+        """
+        self._tries = (prefixes, family_names, given_names, suffixes)
+        self._reset()
+
+    def _reset(self):
+        self._state_ids = {}
+        self._states = []
+        self._transitions = []
+        self._accepts = []
+        self._start = self._add_state(frozenset([(None, 0, 0, False, False)]))
+
+    def _add_state(self, configs):
+        state = self._state_ids.get(configs)
+        if state is None:
+            state = self._state_ids[configs] = len(self._states)
+            self._states.append(configs)
+            self._transitions.append({})
+            self._accepts.append(max((self._accept_weight(config) for config in configs), default=-1))
+        return state
+
+    def _accept_weight(self, config):
+        """在当前位置结束时的姓名权重，不能结束则为-1"""
+        part, node, weight, has_prefix, has_family = config
+        if part is None:
+            return -1
+        weight += self._tries[part].values[0][node]
+        if part == self._PREFIX:
+            weight += 1  # 姓省略
+        return weight
+
+    def _enter(self, part, weight, has_prefix, has_family, ch):
+        """从 part 部分的开头读入 ch，part 及其后的部分都可以省略"""
+        configs = []
+        if part == self._PREFIX:
+            node = self._tries[part].child(0, ch)
+            if node >= 0:
+                configs.append((part, node, 0, False, False))
+            configs += self._enter(self._FAMILY, 1, False, False, ch)
+        elif part == self._FAMILY:
+            node = self._tries[part].child(0, ch)
+            if node >= 0:
+                configs.append((part, node, weight, has_prefix, True))
+            configs += self._enter(self._GIVEN, weight + 1, has_prefix, False, ch)
+        elif part == self._GIVEN:
+            node = self._tries[part].child(0, ch)
+            if node >= 0:
+                configs.append((part, node, weight, has_prefix, has_family))
+            configs += self._enter(self._SUFFIX, weight + 1, False, False, ch)
+        else:
+            node = self._tries[part].child(0, ch)
+            if node >= 0:
+                configs.append((part, node, weight, False, False))
+        return configs
+
+    def _step(self, config, ch):
+        """读入 ch 后的所有非确定状态"""
+        part, node, weight, has_prefix, has_family = config
+        if part is None:
+            return self._enter(self._PREFIX, 0, False, False, ch)
+
+        configs = []
+        if part != self._GIVEN or not has_prefix or has_family:
+            child = self._tries[part].child(node, ch)
+            if child >= 0:
+                configs.append((part, child, weight, has_prefix, has_family))
+
+        part_weight = self._tries[part].values[0][node]
+        if part == self._PREFIX:
+            # 前缀结束，后面接姓，或省略姓接单字名，或再省略名接后缀
+            configs += self._enter(self._FAMILY, part_weight, True, False, ch)
+        elif part == self._FAMILY and part_weight != 0 and not has_prefix:
+            configs += self._enter(self._GIVEN, weight + part_weight, False, True, ch)
+        return configs
+
+    def _next(self, state, ch):
+        configs = set()
+        for config in self._states[state]:
+            configs.update(self._step(config, ch))
+        next_state = self._add_state(frozenset(configs)) if configs else -1
+        self._transitions[state][ch] = next_state
+        return next_state
+
+    @profile('names.match', items=lambda names, self, text, begin=0: len(names))
+    def match(self, text, begin=0):
+        """
+        从 begin 开始匹配姓名
+        :param text: 文本
+        :param begin: 起始位置
+        :return: 结束位置（不含） -> 姓名权重 的字典
+        """
+        if len(self._states) > self.MAX_STATES:
+            self._reset()
+
+        transitions, accepts = self._transitions, self._accepts
+        names = {}
+        state = self._start
+        for end in range(begin + 1, len(text) + 1):
+            ch = text[end - 1]
+            next_state = transitions[state].get(ch)
+            if next_state is None:
+                next_state = self._next(state, ch)
+            if next_state < 0:
+                break
+            state = next_state
+            weight = accepts[state]
+            if weight > 0:
+                # 适当提高一点姓名的最低权重
+                weight = max(weight, 10)
+                if end - begin == 1:
+                    weight = min(weight, 1)
+                names[end] = weight
+        return names
+
+    def match_whole(self, text):
+        """
+        判断整段文本是否姓名
+        :return: 姓名权重，不是姓名则返回-1
+        """
+        return self.match(text).get(len(text), -1)
@@ -0,0 +1,63 @@
+"""
+共享词典的视图
+"""
+
+
+class DictView:
+    """
+    共享字典树的只读视图，只看得见来自指定源词典、长度在范围内的词。
+    字典树本身就能沿前缀前行，不必像独立的词典那样另存前缀词
+    """
+
+    def __init__(self, trie, source_masks, mask, min_length=1, max_length=None):
+        """
+        :param trie: 字典树
+        :param source_masks: 各结点的来源掩码数组
+        :param mask: 视图包含的源词典掩码
+        :param min_length: 最短词长
+        :param max_length: 最长词长，None 表示不限
+        """
+        self.trie = trie
+        self.source_masks = source_masks
+        self.mask = mask
+        self.min_length = min_length
+        self.max_length = max_length
+
+    def __contains__(self, word):
+        return self.get(word) > 0
+
+    def get(self, word, default=-1):
+        """
+        :return: 视图中的词为1，字典树中存在但不在视图中的片段（如词的前缀）为0，否则为 default
+        """
+        if self.max_length is not None and len(word) > self.max_length:
+            return default
+        node = self.trie.find(word)
+        if node < 0:
+            return default
+        return 1 if len(word) >= self.min_length and self.source_masks[node] & self.mask else 0
+
+    def match_longest(self, text, begin=0):
+        """
+        从 begin 开始沿字典树前行，找出视图中以 begin 开头的最长词，前行步数不超过最长词长
+        :return: 最长词的结束位置（不含），没有则为 -1
+        """
+        trie = self.trie
+        base, check, codes = trie.base, trie.check, trie.codes
+        n_codes, n_check = len(codes), len(check)
+        source_masks, mask, min_end = self.source_masks, self.mask, begin + self.min_length
+        end = len(text) if self.max_length is None else min(len(text), begin + self.max_length)
+        node = trie.ROOT
+        longest = -1
+        for j in range(begin, end):
+            o = ord(text[j])
+            code = codes[o] if o < n_codes else 0
+            if not code:
+                break
+            t = base[node] + code
+            if t >= n_check or check[t] != node:
+                break
+            node = t
+            if j + 1 >= min_end and source_masks[node] & mask:
+                longest = j + 1
+        return longest
@@ -0,0 +1,259 @@
+"""
+双数组字典树
+"""
+import json
+import mmap
+import os
+import struct
+from array import array
+
+
+class DoubleArrayTrie:
+    """
+    双数组字典树（Double-Array Trie）
+
+    所有结点紧凑地存放在 base/check 两个整型数组中：结点 s 经字符 c 转移到 t = base[s] + code(c)，
+    当且仅当 check[t] == s 时转移有效。每个结点可附带若干整型值（如权重、词性编号），
+    前缀结点的值均为0。
+    """
+
+    ROOT = 0
+
+    MAGIC = b'JMDAT'
+    VERSION = 2
+    """二进制文件格式版本，格式不兼容的改动须递增"""
+    _ENDIAN_MARK = 0x01020304
+    _HEADER = struct.Struct('<8sII16sIIIII')
+    """文件头：魔数、版本、字节序标记、值字段类型码、词条数、结点数、编码表长度、词性表字节数、附加信息字节数"""
+    _ALIGN = 8
+    """各数组在文件中按8字节对齐"""
+
+    def __init__(self, base, check, codes, values, props, size=0, meta=None):
+        self.base = base
+        self.check = check
+        self.codes = codes
+        """字符到紧凑编码的映射表，以字符的 ord 为下标，0 表示字符不在字母表中"""
+        self.values = values
+        """结点值，每个字段一个数组，以结点编号为下标"""
+        self.props = props
+        """词性表，结点值中的词性以在此表中的下标存放"""
+        self.size = size
+        """收录的词条数"""
+        self.meta = meta or {}
+        """附加信息，随二进制文件一同保存"""
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, word):
+        return self.find(word) >= 0
+
+    @classmethod
+    def build(cls, entries, typecodes='i', props=None):
+        """
+        构建字典树
+        :param entries: 词条字典，word -> 与 typecodes 等长的值元组
+        :param typecodes: 每个值字段的数组类型码，如 'i' 为整型，'d' 为浮点型
+        :param props: 词性表
+        :return: 构建好的字典树
+        """
+        keys = sorted(entries)
+        fields = [array(tc, (entries[key][f] for key in keys)) for f, tc in enumerate(typecodes)]
+        return cls.build_sorted(keys, fields, props)
+
+    @classmethod
+    def build_sorted(cls, keys, fields, props=None):
+        """
+        由已排序的词条构建字典树，词条以列存放，比词条字典省内存
+        :param keys: 升序排列且不重复的词列表
+        :param fields: 值字段数组的列表，每个数组与 keys 等长
+        :param props: 词性表
+        :return: 构建好的字典树
+        """
+        # 按字频分配字符编码，高频字编码小，数组更紧凑
+        freq = {}
+        for key in keys:
+            for ch in key:
+                freq[ch] = freq.get(ch, 0) + 1
+        codes = array('i', bytes(4 * (max(map(ord, freq)) + 1 if freq else 1)))
+        for code, ch in enumerate(sorted(freq, key=lambda x: (-freq[x], x)), 1):
+            codes[ord(ch)] = code
+        max_code = len(freq)
+
+        capacity = max(1024, len(keys) * 4)
+        base = array('i', bytes(4 * capacity))
+        check = array('i', [-1]) * capacity
+        values = [array(field.typecode, bytes(field.itemsize * capacity)) for field in fields]
+        used = bytearray(capacity)
+        used[cls.ROOT] = 1
+
+        next_check_pos = 1
+        max_index = 0
+        stack = [(cls.ROOT, 0, len(keys), 0)]
+        while stack:
+            node, lo, hi, depth = stack.pop()
+            if lo < hi and len(keys[lo]) == depth:
+                # 词尾结点，排序后完整词总在同前缀的最前面
+                for f, field in enumerate(fields):
+                    values[f][node] = field[lo]
+                lo += 1
+            if lo >= hi:
+                continue
+
+            # 按下一个字符对词条分组
+            children = []
+            k = lo
+            while k < hi:
+                ch = keys[k][depth]
+                m = k + 1
+                while m < hi and keys[m][depth] == ch:
+                    m += 1
+                children.append((codes[ord(ch)], k, m))
+                k = m
+            child_codes = [c for c, _, _ in children]
+            first_code = min(child_codes)
+            span = max(child_codes) - first_code
+
+            # 为子结点寻找可用的 base
+            pos = max(next_check_pos, first_code + 1)
+            nonzero = 0
+            while True:
+                free = used.find(0, pos)
+                if free < 0 or free + span >= capacity:
+                    grow = max(capacity, max_code)
+                    base.extend(array('i', bytes(4 * grow)))
+                    check.extend(array('i', [-1]) * grow)
+                    for v in values:
+                        v.extend(array(v.typecode, bytes(v.itemsize * grow)))
+                    used.extend(bytes(grow))
+                    capacity += grow
+                    continue
+                nonzero += free - pos
+                pos = free
+                b = pos - first_code
+                if all(not used[b + c] for c in child_codes):
+                    break
+                pos += 1
+                nonzero += 1
+            if nonzero >= 0.95 * (pos - next_check_pos + 1):
+                next_check_pos = pos
+
+            base[node] = b
+            for c, k, m in children:
+                t = b + c
+                used[t] = 1
+                check[t] = node
+                if t > max_index:
+                    max_index = t
+                stack.append((t, k, m, depth + 1))
+
+        n = max_index + 1
+        meta = {'max_length': max(map(len, keys), default=0)}
+        return cls(base[:n], check[:n], codes, [v[:n] for v in values], list(props or ['']), len(keys), meta)
+
+    def save(self, path):
+        """
+        保存为只读二进制文件，先写临时文件再替换，并发读取的进程不会读到半个文件
+        :param path: 文件路径
+        """
+        props = "\n".join(self.props).encode('utf-8')
+        meta = json.dumps(self.meta, ensure_ascii=False).encode('utf-8')
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as file:
+            typecodes = ''.join(v.typecode for v in self.values).encode('ascii')
+            file.write(self._HEADER.pack(self.MAGIC, self.VERSION, self._ENDIAN_MARK, typecodes, self.size,
+                                         len(self.check), len(self.codes), len(props), len(meta)))
+            for a in [self.base, self.check, self.codes] + list(self.values):
+                file.write(bytes(-file.tell() % self._ALIGN))
+                file.write(memoryview(a).cast('B'))
+            file.write(props)
+            file.write(meta)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        以内存映射方式打开二进制文件，数组直接在映射内存上查询，不拷贝到进程堆上，
+        同一主机上的多个进程共享同一份页缓存
+        :param path: 文件路径
+        :return: 字典树
+        :raise ValueError: 文件格式或版本不符，或文件被截断
+        """
+        with open(path, 'rb') as file:
+            mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm.size() < cls._HEADER.size:
+            raise ValueError(f"bad dict trie file '{path}'")
+        magic, version, endian_mark, typecodes, size, nodes, n_codes, props_len, meta_len = cls._HEADER.unpack_from(mm)
+        if magic.rstrip(b'\0') != cls.MAGIC or version != cls.VERSION or endian_mark != cls._ENDIAN_MARK:
+            raise ValueError(f"incompatible dict trie file '{path}', version: {version}")
+
+        typecodes = typecodes.rstrip(b'\0').decode('ascii')
+        layout = list(zip('iii' + typecodes, [nodes, nodes, n_codes] + [nodes] * len(typecodes)))
+        end = cls._HEADER.size
+        for tc, length in layout:
+            end += -end % cls._ALIGN + length * array(tc).itemsize
+        if mm.size() < end + props_len + meta_len:
+            raise ValueError(f"truncated dict trie file '{path}', size: {mm.size()}, expected: {end + props_len + meta_len}")
+
+        view = memoryview(mm)
+        offset = cls._HEADER.size
+        arrays = []
+        for tc, length in layout:
+            offset += -offset % cls._ALIGN
+            size_in_bytes = length * array(tc).itemsize
+            arrays.append(view[offset:offset + size_in_bytes].cast(tc))
+            offset += size_in_bytes
+        props = bytes(view[offset:offset + props_len]).decode('utf-8').split("\n")
+        offset += props_len
+        meta = json.loads(bytes(view[offset:offset + meta_len]).decode('utf-8'))
+        return cls(arrays[0], arrays[1], arrays[2], arrays[3:], props, size, meta)
+
+    def child(self, node, ch):
+        """
+        结点经字符转移
+        :return: 子结点编号，不存在则返回-1
+        """
+        o = ord(ch)
+        code = self.codes[o] if o < len(self.codes) else 0
+        if code:
+            t = self.base[node] + code
+            if t < len(self.check) and self.check[t] == node:
+                return t
+        return -1
+
+    def find(self, word):
+        """
+        查找词条对应的结点
+        :return: 结点编号，不存在则返回-1
+        """
+        node = self.ROOT
+        for ch in word:
+            node = self.child(node, ch)
+            if node < 0:
+                break
+        return node
+
+    def max_length(self):
+        """
+        最长词条的长度，构建时记在附加信息中；旧文件中没有时由 check 数组逐个结点回溯父结点求出最大深度
+        """
+        max_length = self.meta.get('max_length')
+        if max_length is None:
+            check = self.check
+            depths = array('i', [-1]) * len(check)
+            depths[self.ROOT] = 0
+            max_length = 0
+            for node in range(len(check)):
+                if check[node] < 0 or depths[node] >= 0:
+                    continue
+                path = []
+                while depths[node] < 0:
+                    path.append(node)
+                    node = check[node]
+                depth = depths[node]
+                for node in reversed(path):
+                    depth += 1
+                    depths[node] = depth
+                max_length = max(max_length, depth)
+            self.meta['max_length'] = max_length
+        return max_length
@@ -1,13 +1,25 @@
+import gc
 import hashlib
 import logging
-import marshal
+import mmap
+import multiprocessing
 import os
 import re
 import sys
 import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from math import log
 
+import build_dict
 import jamen_utils
+import regex_trie
+from aho_corasick import AhoCorasick
+from chinese_name_matcher import ChineseNameMatcher
+from dict_view import DictView
+from double_array_trie import DoubleArrayTrie
+from jamen_profiler import profile
 
 logging.basicConfig(
     stream=sys.stderr,
@@ -22,120 +34,452 @@ class JamenCutter:
     _re_block = re.compile("([\u4E00-\u9FD5]+|[a-zA-Z0-9_\\-]+)", re.U)
     _re_eng = re.compile("[a-zA-Z_\\-]+", re.U)
     _re_han = re.compile("[\u4E00-\u9FD5]+", re.U)
+    _re_alnum = re.compile("[a-zA-Z0-9_\\-]+", re.U)
+    _re_gap = re.compile("[^\u4E00-\u9FD5a-zA-Z0-9_\\-]+", re.U)
     MIN_HAN_WORD_LENGTH = 1
     MAX_HAN_WORD_LENGTH = 0xFFFFFFF
     MIN_NAME_LENGTH = 2
     MAX_NAME_LENGTH = 6
+    MIN_SHARD_SIZE = 10000
+    """并行切分时分片的最小字数"""
+    ROUTE_TIE_EPSILON = 1e-6
+    """路径分数相差不超过此值视为相同，取较长的词，不受浮点累加误差左右"""
 
-    _chinese_words = {}  # 完整字典
-    _chinese_words_total_weight = 0
-    _chinese_family_names = {}
-    _chinese_given_names = {}
-    _chinese_name_prefixes = {}
-    _chinese_name_suffixes = {}
-    _japanese_names = {}
-    _english_names = {}
-
-    _not_included_regex = re.compile("")
-    """未收录词正则式"""
-
-    def __init__(self):
-        self._load_dicts_with_cache([
-            'dict/jieba_without_nr.dict',
-            'dict/chinese.dict',
-            'dict/chinese_regions.dict',
-            'dict/world_countries.dict',
-            'dict/chinese_colleges.dict',
-            'dict/chinese_stop_words.dict',
-        ], self._chinese_words)
-
-        for v in self._chinese_words.values():
-            self._chinese_words_total_weight += v[0]
-        logger.info(f"dict words count: {len(self._chinese_words)}")
-
-        self._load_dicts_with_cache(['dict/japanese_names.dict'], self._japanese_names)
-        self._load_dicts_with_cache(['dict/english_names.dict'], self._english_names)
-        self._load_dicts_with_cache(['dict/chinese_family_names.dict'], self._chinese_family_names)
-        self._load_dicts_with_cache(['dict/chinese_given_names.dict'], self._chinese_given_names)
-        self._load_dicts_with_cache(['dict/chinese_name_prefixes.dict'], self._chinese_name_prefixes)
-        self._load_dicts_with_cache(['dict/chinese_name_suffixes.dict'], self._chinese_name_suffixes)
-        self.__load_not_included_regex('data/not_included_regexps.txt')
-
-    def _load_dicts_with_cache(self, dict_path_list, dict, with_cache=True):
-        cache_file_path = ''
-        need_update = False
-
-        if with_cache:
-            cache_dir = "tmp"
-            jamen_utils.makesure_dir(cache_dir)
-            cache_file_name = hashlib.sha1((",".join(dict_path_list)).encode('utf-8')).hexdigest()
-            cache_file_path = os.path.join(cache_dir, cache_file_name)
-
-            if not os.path.exists(cache_file_path):
-                need_update = True
+    WORD_DICT_PATH_LIST = [
+        'dict/jieba_without_nr.dict',
+        'dict/chinese.dict',
+        'dict/chinese_regions.dict',
+        'dict/world_countries.dict',
+        'dict/chinese_colleges.dict',
+        'dict/chinese_stop_words.dict',
+    ]
+    """普通词典"""
+    NAME_DICT_PATH_LIST = [
+        'dict/japanese_names.dict',
+        'dict/english_names.dict',
+    ]
+    """外文人名词典，排在前面的优先"""
+    CHINESE_NAME_DICT_PATH_LIST = [
+        'dict/chinese_name_prefixes.dict',
+        'dict/chinese_family_names.dict',
+        'dict/chinese_given_names.dict',
+        'dict/chinese_name_suffixes.dict',
+    ]
+    """中文姓名组成部分词典：前缀、姓、名、后缀"""
+    NOT_INCLUDED_REGEX_PATH = 'data/not_included_regexps.txt'
+
+    COMPILED_DICT_PATH = 'dict/words.dat'
+    """由 build_dict.py 离线构建的普通词与外文人名字典树，存在时直接加载，不再检查源词典"""
+    CACHE_DIR = 'tmp'
+    """编译好的二进制词典的缓存目录"""
+    _DICT_CACHE_VERSION = 3
+    """词典缓存版本，字典树结点值的布局改变时须递增"""
+    _dict_groups = {}
+    """已加载的词典组，组名 -> 词典对象，各组在首次使用时才加载"""
+    _startup_report = []
+    """各词典加载、解析、构建的耗时与内存"""
+    _props = []
+    """词性表，切分结果中的词性以在此表中的下标存放，前段与字典树的词性表一致"""
+    _prop_ids = {}
+
+    def __init__(self, debug_route=False, clip_cache_size=20000, route_window=None):
+        """
+        :param debug_route: 是否记录路径计算中每个位置的所有候选，供调试
+        :param clip_cache_size: 片段切分结果缓存的最大片段数，0 表示不缓存
+        :param route_window: 超过此长度的中文片段按窗口分段切分，首词延迟与内存只取决于窗口大小，None 表示不分段。
+                             窗口小于最长的词或姓名时按最长的词或姓名计
+        """
+        self.debug_route = debug_route
+        self.route_debug = {}
+        """最近一个片段的候选路径，仅在 debug_route 为真时记录"""
+        self._user_dicts = OrderedDict()
+        """用户词典叠加层，层名 -> {词: (权重, 词性)}，叠加在基础词典之上，可随时移除"""
+        self._user_words = {}
+        """各叠加层合并后生效的词，只收录权重高于基础词典的词，同样带前缀词"""
+        self._user_prefix_counts = {}
+        """前缀 -> 以其为前缀的生效词数，移除叠加层时据此清理前缀词"""
+        self._user_total_weight = 0
+        """叠加层对普通词总权重的增量"""
+        self._dict_version = 0
+        """词典版本，叠加层改变后递增，片段缓存据此作废"""
+        self.route_window = route_window
+        self.clip_cache_size = clip_cache_size
+        self._clip_cache = OrderedDict()
+        """片段 -> (词, 词性) 元组，按最近使用排序"""
+        self._clip_cache_version = self._dict_version
+        self._clip_cache_hits = 0
+        self._clip_cache_misses = 0
+        self._clip_cache_evictions = 0
+        self._dag_starts = array('i', bytes(4 * 256))
+        self._dag_ends = array('i', bytes(4 * 1024))
+        self._dag_log_probs = array('d', bytes(8 * 1024))
+        self._dag_prop_ids = array('i', bytes(4 * 1024))
+
+    @property
+    def _dict_trie(self):
+        """
+        词典与外文人名合并而成的双数组字典树，结点值依次为：词权重、词性编号、人名权重、词权重对数、人名权重对数、来源掩码，
+        来源掩码的第 k 位表示 meta['sources'] 中第 k 个词典收录了此词
+        """
+        return self._get_dict_group('words')
+
+    @property
+    def _chinese_name_matcher(self):
+        """由姓名各组成部分的字典树编译成的姓名匹配自动机"""
+        return self._get_dict_group('names')
+
+    @property
+    def _not_included_regex(self):
+        """未收录词正则式"""
+        return self._get_dict_group('regex')
+
+    @property
+    def _chinese_words_total_weight(self):
+        return self._dict_trie.meta['total_weight'] + self._user_total_weight
+
+    def _get_dict_group(self, group):
+        """
+        获取词典组，首次使用时才加载：姓名词典在切分中第一次遇到不成词的片段、需要匹配姓名时才加载，
+        未收录词正则式在第一次需要拆分连续单字时才加载。实际文本的切分通常很快就会用到这两组
+        :param group: 组名，words：普通词与外文人名，names：中文姓名，regex：未收录词正则式
+        :return: 词典对象
+        """
+        value = self._dict_groups.get(group)
+        if value is None:
+            begin_time = time.perf_counter()
+            begin_rss = jamen_utils.get_rss()
+            if group == 'words':
+                value = self._load_compiled_dict() or self._load_trie_with_cache(
+                    self.WORD_DICT_PATH_LIST + self.NAME_DICT_PATH_LIST,
+                    lambda: self._build_dict_trie(self.WORD_DICT_PATH_LIST, self.NAME_DICT_PATH_LIST))
+                JamenCutter._props = list(value.props)
+                JamenCutter._prop_ids = {prop: i for i, prop in enumerate(value.props)}
+                logger.info(f"dict words count: {len(value)}")
+            elif group == 'names':
+                value = ChineseNameMatcher(*self._load_name_tries_with_cache(self.CHINESE_NAME_DICT_PATH_LIST))
             else:
-                cache_modify_time = os.path.getmtime(cache_file_path)
-                for dict_path in dict_path_list:
-                    modify_time = os.path.getmtime(dict_path)
-                    if modify_time > cache_modify_time:
-                        need_update = True
-                        break
-
-        if with_cache and not need_update:
-            with open(cache_file_path, 'rb') as file:
-                dict.update(marshal.load(file))
-                logger.debug(f"load dict from cache '{cache_file_path}'")
+                value = self._load_not_included_regex(self.NOT_INCLUDED_REGEX_PATH)
+            self._dict_groups[group] = value
+            self._report_startup(group, 'load', begin_time, begin_rss)
+        return value
+
+    def load_dict_groups(self):
+        """加载所有词典组并预读映射页，之后派生的工作进程不必再各自加载"""
+        for group in ('words', 'names', 'regex'):
+            self._get_dict_group(group)
+        for trie in [self._dict_trie] + list(self._chinese_name_matcher._tries):
+            for a in [trie.base, trie.check, trie.codes] + list(trie.values):
+                sum(a[::mmap.PAGESIZE // a.itemsize])  # 每页读一次，把映射页调入页缓存
+
+    def preload(self):
+        """
+        预加载模式，供预派生（prefork）的工作进程池使用：在父进程中加载所有词典组，
+        再把此前创建的所有对象移出垃圾回收的跟踪范围。派生出的工作进程不再加载词典，
+        垃圾回收也不会遍历这些对象而改写其所在的页，写时复制的共享得以保持。
+        冻结的对象此后即使成为循环垃圾也不会被回收，须由调用方在派生工作进程之前显式调用
+        """
+        self.load_dict_groups()
+        gc.collect()
+        gc.freeze()
+        logger.info(f"preload done, frozen objects: {gc.get_freeze_count()}")
+
+    @classmethod
+    def _report_startup(cls, name, stage, begin_time, begin_rss):
+        seconds = time.perf_counter() - begin_time
+        memory = jamen_utils.get_rss() - begin_rss
+        cls._startup_report.append({'name': name, 'stage': stage, 'seconds': seconds, 'memory': memory})
+        logger.debug(f"{stage} '{name}' done, time cost: {seconds:.3f}s, memory: {memory / 1048576:.1f}MB")
+
+    @classmethod
+    def startup_report(cls):
+        """
+        内存为进程常驻内存的增量，以内存映射方式打开的词典由各进程共享，不计入其中；无法获取常驻内存的平台上为0
+        内存为进程常驻内存的增量，以内存映射方式打开的词典由各进程共享，不计入其中
+        :return: [{'name': 名称, 'stage': 阶段, 'seconds': 秒数, 'memory': 字节数}, ...]
+        """
+        return list(cls._startup_report)
+
+    @classmethod
+    def _get_cache_path(cls, dict_path_list):
+        """
+        获取词典缓存文件路径，缓存不存在或比任一词典旧时返回的 need_update 为真
+        :return: (缓存文件路径, 是否需要更新)
+        """
+        cache_dir = cls.CACHE_DIR
+        jamen_utils.makesure_dir(cache_dir)
+        cache_key = f"{cls._DICT_CACHE_VERSION}:{','.join(dict_path_list)}"
+        cache_file_name = hashlib.sha1(cache_key.encode('utf-8')).hexdigest() + '.dat'
+        cache_file_path = os.path.join(cache_dir, cache_file_name)
+
+        if not os.path.exists(cache_file_path):
+            return cache_file_path, True
+
+        cache_modify_time = os.path.getmtime(cache_file_path)
+        for dict_path in dict_path_list:
+            if os.path.exists(dict_path) and os.path.getmtime(dict_path) > cache_modify_time:
+                return cache_file_path, True
+        return cache_file_path, False
+
+    def _load_trie_with_cache(self, dict_path_list, build, with_cache=True):
+        """
+        加载编译好的二进制词典，缓存缺失、过期或版本不符时重新构建并写入缓存。
+        词典以内存映射方式打开，启动几乎不耗时，同一主机上的多个进程共享同一份页缓存
+        :param dict_path_list: 源词典列表
+        :param build: 构建字典树的函数
+        :param with_cache: 是否使用缓存
+        :return: 字典树
+        """
+        if not with_cache:
+            return build()
+
+        cache_file_path, need_update = self._get_cache_path(dict_path_list)
+        if not need_update:
+            try:
+                trie = DoubleArrayTrie.load(cache_file_path)
+                logger.debug(f"load dict trie from cache '{cache_file_path}'")
+                return trie
+            except ValueError as e:
+                logger.warning(f"{e}, rebuild it")
+
+        build().save(cache_file_path)
+        logger.debug(f"dump dict trie into cache '{cache_file_path}'")
+        # 重新以内存映射方式打开，释放构建时占用的堆内存
+        return DoubleArrayTrie.load(cache_file_path)
+
+    def _load_compiled_dict(self):
+        """
+        加载离线构建的字典树
+        :return: 字典树，不存在或布局版本不符时返回 None
+        """
+        dict_path = self.COMPILED_DICT_PATH
+        if not dict_path or not os.path.exists(dict_path):
+            return None
+        try:
+            trie = DoubleArrayTrie.load(dict_path)
+        except ValueError as e:
+            logger.warning(f"{e}, ignored")
+            return None
+        if trie.meta.get('layout_version') != self._DICT_CACHE_VERSION:
+            logger.warning(f"compiled dict '{dict_path}' layout version mismatch, ignored")
+            return None
+
+        modify_time = os.path.getmtime(dict_path)
+        for source_path in trie.meta.get('sources', []):
+            if os.path.exists(source_path) and os.path.getmtime(source_path) > modify_time:
+                logger.warning(f"compiled dict '{dict_path}' is older than '{source_path}', run build_dict.py to rebuild")
+        logger.debug(f"load compiled dict '{dict_path}'")
+        return trie
+
+    def _load_name_tries_with_cache(self, dict_path_list):
+        """
+        加载中文姓名各组成部分的字典树，需要重新构建的词典并行解析
+        :return: 与 dict_path_list 对应的字典树列表
+        """
+        stale_path_list = [dict_path for dict_path in dict_path_list if self._get_cache_path([dict_path])[1]]
+        parsed = dict(zip(stale_path_list, self._parse_dicts(stale_path_list)))
+        return [self._load_trie_with_cache(
+            [dict_path],
+            lambda dict_path=dict_path: self._build_name_trie(
+                parsed[dict_path] if dict_path in parsed else self._parse_dicts([dict_path])[0]))
+            for dict_path in dict_path_list]
+
+    def _parse_dicts(self, dict_path_list):
+        """
+        解析词典文件，多核时各文件在独立进程中并行解析，在守护进程中串行解析
+        :return: 与 dict_path_list 对应的 {词: (权重, 词性)} 列表
+        """
+        processes = min(len(dict_path_list), os.cpu_count() or 1)
+        if multiprocessing.current_process().daemon:
+            processes = 1  # 守护进程（如 multiprocessing.Pool 的工作进程）不能再派生子进程，只能串行解析
+        if processes > 1:
+            with ProcessPoolExecutor(processes) as executor:
+                results = list(executor.map(_parse_dict, dict_path_list))
         else:
-            for dict_path in dict_path_list:
-                self._load_dict(dict_path, dict)
+            results = [_parse_dict(dict_path) for dict_path in dict_path_list]
 
-        if with_cache and need_update:
-            with open(cache_file_path, 'wb') as file:
-                marshal.dump(dict, file)
-                logger.debug(f"dump dict into cache '{cache_file_path}'")
+        for dict_path, (words, seconds, memory) in zip(dict_path_list, results):
+            self._startup_report.append({'name': dict_path, 'stage': 'parse', 'seconds': seconds, 'memory': memory})
+            logger.debug(f"parse '{dict_path}' done, time cost: {seconds:.3f}s, memory: {memory / 1048576:.1f}MB")
+        return [words for words, seconds, memory in results]
 
-    def _load_dict(self, dict_path, dict):
-        logger.debug(f"load dict['{dict_path}']...")
-        with open(dict_path, 'r', encoding='UTF-8') as f:
-            for line in [l.strip() for l in f if l.strip()]:
-                if line[:1] == '#':
-                    # 忽略注释
-                    continue
+    def _build_dict_trie(self, word_dict_path_list, name_dict_path_list):
+        """
+        加载普通词典与外文人名词典，合并构建为一棵双数组字典树
+        :param word_dict_path_list: 普通词典列表
+        :param name_dict_path_list: 外文人名词典列表，排在前面的词典优先
+        :return: 字典树
+        """
+        parsed = self._parse_dicts(word_dict_path_list + name_dict_path_list)
+        begin_time = time.perf_counter()
+        begin_rss = jamen_utils.get_rss()
 
-                word, weight, prop = (line + ' 1 x').split(' ')[:3]
-                weight = int(float(weight))
-                self._add_word(dict, word, weight, prop)
+        words = {}
+        source_masks = {}
+        for index, tmp_words in enumerate(parsed[:len(word_dict_path_list)]):
+            for word, (weight, prop) in tmp_words.items():
+                self._add_word(words, word, weight, prop, with_prefix=False)
+                source_masks[word] = source_masks.get(word, 0) | build_dict.source_mask([index])
 
-        logger.debug(f"load dict['{dict_path}'] done, size: {len(dict)} ")
+        # 外文人名取最靠前的收录此名的词典中的权重，同一词典中的重复项由 _load_dict 取权重最高的一条，与 build_dict 一致
+        names = {}
+        for tmp_names in parsed[len(word_dict_path_list):]:
+            for name, (weight, prop) in tmp_names.items():
+                if weight > 0 and name not in names:
+                    names[name] = weight
 
-    def __load_not_included_regex(self, dict_path):
-        """加载模糊停止词正则式"""
-        reg_str = ""
-        with open(dict_path, 'r', encoding='UTF-8') as f:
-            for exp in [l.strip() for l in f if l.strip()]:
-                if exp[:1] == '#':
-                    # 忽略注释
-                    continue
+        trie = build_dict.compile_word_trie(
+            (word, *words.get(word, (0, '')), names.get(word, 0), source_masks.get(word, 0))
+            for word in sorted(words.keys() | names.keys()))
+        trie.meta['sources'] = word_dict_path_list + name_dict_path_list
+        logger.debug(f"build dict trie done, size: {len(trie)}, nodes: {len(trie.check)}")
+        self._report_startup('words', 'build', begin_time, begin_rss)
+        return trie
+
+    def dict_view(self, dict_path_list, min_length=1, max_length=None):
+        """
+        获取共享词典的视图，只看得见来自指定源词典、长度在范围内的词。
+        视图与切分器共用同一棵已加载的字典树，不再重复加载、解析词典
+        :param dict_path_list: 源词典列表，须在 WORD_DICT_PATH_LIST 中
+        :param min_length: 最短词长
+        :param max_length: 最长词长，None 表示不限
+        :return: 词典视图
+        """
+        trie = self._dict_trie
+        sources = trie.meta.get('sources', [])
+        mask = 0
+        for dict_path in dict_path_list:
+            if dict_path in sources:
+                mask |= build_dict.source_mask([sources.index(dict_path)])
+            else:
+                logger.warning(f"dict['{dict_path}'] not in shared dict, skipped")
+        return DictView(trie, trie.values[5], mask, min_length, max_length)
+
+    @staticmethod
+    def _build_name_trie(names):
+        """
+        构建中文姓名组成部分（姓、名、前缀、后缀）的字典树，结点值为权重
+        :param names: {名: (权重, 词性)}
+        """
+        return DoubleArrayTrie.build({name: (weight,) for name, (weight, prop) in names.items()})
 
-                if len(reg_str) != 0:
-                    reg_str += '|'
-                reg_str += exp
-        self._not_included_regex = re.compile(f"({reg_str})", re.U)
-        # self.__stop_regex = re.compile(f"{reg_str}", re.U)
+    @classmethod
+    def _load_dict(cls, dict_path, dict, with_prefix=True):
+        if not os.path.exists(dict_path):
+            logger.warning(f"dict['{dict_path}'] not found, skipped")
+            return
+
+        logger.debug(f"load dict['{dict_path}']...")
+        for word, weight, prop in jamen_utils.iter_dict(dict_path):
+            cls._add_word(dict, word, weight, prop, with_prefix)
+
+        logger.debug(f"load dict['{dict_path}'] done, size: {len(dict)} ")
+
+    @staticmethod
+    def _load_not_included_regex(dict_path):
+        """加载模糊停止词正则式，有限的正则式合并成字典树，匹配结果与逐一拼接的正则式相同"""
+        return regex_trie.compile_patterns(regex_trie.load_patterns(dict_path), group=True)
 
     def add_word(self, word, weight=1, prop='x'):
-        pre_weight = self._chinese_words.get(word, (0, 'x'))[0]
-        self._add_word(self._chinese_words, word, weight, prop)
-        self._chinese_words_total_weight += (weight - pre_weight)
+        self.add_words([(word, weight, prop)])
+
+    def add_words(self, words, layer='user'):
+        """
+        批量追加词到指定叠加层，同一层内同一个词保留权重最高的
+        :param words: 词的列表，元素为 词、(词, 权重) 或 (词, 权重, 词性)
+        :param layer: 叠加层名称
+        """
+        user_dict = self._user_dicts.setdefault(layer, {})
+        changed_words = []
+        for item in words:
+            item = (item,) if isinstance(item, str) else tuple(item)
+            word, weight, prop = item + (1, 'x')[len(item) - 1:]
+            self._add_word(user_dict, word, weight, prop, with_prefix=False)
+            changed_words.append(word)
+        self._update_user_words(changed_words)
+
+    def load_user_dict(self, dict_path, layer=None):
+        """
+        加载用户词典文件作为一个叠加层，不影响基础词典及其缓存
+        :param dict_path: 词典路径，格式与基础词典相同
+        :param layer: 叠加层名称，默认为词典路径
+        :return: 叠加层名称
+        """
+        layer = layer or dict_path
+        user_dict = {}
+        self._load_dict(dict_path, user_dict, with_prefix=False)
+        self.remove_user_dict(layer)
+        self._user_dicts[layer] = user_dict
+        self._update_user_words(user_dict.keys())
+        return layer
+
+    def remove_user_dict(self, layer):
+        """
+        移除叠加层，被其覆盖的词恢复为其它层或基础词典中的值
+        :param layer: 叠加层名称
+        """
+        user_dict = self._user_dicts.pop(layer, None)
+        if user_dict:
+            self._update_user_words(user_dict.keys())
+
+    def _update_user_words(self, words):
+        """
+        重新计算指定词在各叠加层合并后的生效值，增量更新前缀词与总权重
+        :param words: 发生变化的词
+        """
+        for word in words:
+            old_weight, old_prop = self._user_words.get(word, (0, ''))
+            dict_weight = max(0, self._get_dict_word(word)[0])
+
+            # 权重最高的生效，权重相同时基础词典与先加的层优先
+            new_weight, new_prop = dict_weight, None
+            for user_dict in self._user_dicts.values():
+                weight, prop = user_dict.get(word, (0, ''))
+                if weight > new_weight:
+                    new_weight, new_prop = weight, prop
+
+            self._user_total_weight += (new_weight - max(old_weight, dict_weight))
+            if new_prop is not None:
+                if old_weight == 0:
+                    self._add_user_prefixes(word, 1)
+                self._user_words[word] = new_weight, new_prop
+            elif old_weight > 0:
+                self._add_user_prefixes(word, -1)
+                if self._user_prefix_counts.get(word, 0) > 0:
+                    self._user_words[word] = 0, ''  # 前缀词权重为0
+                else:
+                    del self._user_words[word]
+        self._dict_version += 1
+
+    def _add_user_prefixes(self, word, delta):
+        for i in range(1, len(word)):
+            frag = word[:i]
+            count = self._user_prefix_counts.get(frag, 0) + delta
+            if count > 0:
+                self._user_prefix_counts[frag] = count
+                self._user_words.setdefault(frag, (0, ''))
+            else:
+                self._user_prefix_counts.pop(frag, None)
+                if self._user_words.get(frag, (0, ''))[0] == 0:
+                    self._user_words.pop(frag, None)
+
+    def _get_dict_word(self, word):
+        """
+        从字典树中查找普通词
+        :return: (权重, 词性)，前缀词权重为0，不存在的词权重为-1
+        """
+        node = self._dict_trie.find(word)
+        if node < 0:
+            return -1, ''
+        return self._dict_trie.values[0][node], self._dict_trie.props[self._dict_trie.values[1][node]]
 
     @staticmethod
-    def _add_word(dict, word, weight, prop):
+    def _add_word(dict, word, weight, prop, with_prefix=True):
         old_weight, old_prop = dict.get(word, (0, ''))
         if weight > old_weight:
             dict[word] = weight, prop
 
             # 构建前缀词典
-            for i in range(1, len(word)):
+            for i in range(1, len(word)) if with_prefix else ():
                 frag = word[:i]
                 if frag not in dict:
                     dict[frag] = 0, ''  # 前缀词权重为0
@@ -145,21 +489,167 @@ class JamenCutter:
             yield word
 
     def cut_with_prop(self, sentence):
-        clips = self._re_block.split(sentence)  # 切分成不包含标点的片段
-        for clip in clips:
-            if not clip:
-                continue
+        for start, end in self._iter_clips(sentence):  # 切分成不包含标点的片段
+            yield from self._cut_clip(sentence[start:end])
 
-            if self._re_eng.match(clip):
-                # 英文单词，直接入标签
-                yield clip, 'eng'
+    def cut_many(self, lines):
+        """
+        批量切分多行文本，结果与逐行调用 cut_with_prop 完全一致。
+        相同的行只切分一次，所有行中相同的中文片段也只切分一次，
+        未缓存的片段一起构建有向图、计算路径，省去逐行逐片段调用的开销
+        :param lines: 文本行列表
+        :return: 与 lines 一一对应的 [(词, 词性), ...] 列表
+        """
+        line_clips = {}
+        han_clips = {}
+        for line in lines:
+            if line in line_clips:
                 continue
+            clips = line_clips[line] = []
+            for start, end in self._iter_clips(line):
+                clip = line[start:end]
+                if self._re_eng.match(clip):
+                    clips.append((clip, 'eng'))
+                elif self._re_han.match(clip):
+                    clips.append((clip, None))
+                    han_clips.setdefault(clip, None)
+                else:
+                    clips.append((clip, 'sym'))
+
+        han_clips = dict(zip(han_clips, self._cut_routes(list(han_clips))))
+        results = {}
+        for line, clips in line_clips.items():
+            words = results[line] = []
+            for clip, prop in clips:
+                if prop is None:
+                    words.extend(han_clips[clip])
+                else:
+                    words.append((clip, prop))
+        return [list(results[line]) for line in lines]
+
+    def cut_spans(self, sentence):
+        """
+        切分文本，只返回各词在原文中的位置与词性编号，不生成词的字符串，
+        供索引、高亮等只需要位置的场合使用。结果与 cut_with_prop 一一对应，包括英文与符号片段，
+        直接由路径数组得出，不经过片段缓存
+        :param sentence: 文本
+        :return: (starts, ends, prop_ids) 三个 array('i')，第 k 个词为 sentence[starts[k]:ends[k]]，
+                 词性为 prop_name(prop_ids[k])
+        """
+        self._get_dict_group('words')  # 加载词典时会重建词性表，先加载再取词性编号
+        eng, sym = self._get_prop_id('eng'), self._get_prop_id('sym')
+        starts, ends, prop_ids = array('i'), array('i'), array('i')
+        for start, end in self._iter_clips(sentence):
+            if self._re_eng.match(sentence, start, end):
+                starts.append(start)
+                ends.append(end)
+                prop_ids.append(eng)
+            elif self._re_han.match(sentence, start, end):
+                clip = sentence[start:end]
+                route_ends, route_prop_ids = self._calc_route(clip, self._build_dag(clip))
+                i = 0
+                while i < len(clip):
+                    j = route_ends[i] + 1
+                    starts.append(start + i)
+                    ends.append(start + j)
+                    prop_ids.append(route_prop_ids[i])
+                    i = j
+            else:
+                starts.append(start)
+                ends.append(end)
+                prop_ids.append(sym)
+        return starts, ends, prop_ids
+
+    @classmethod
+    def prop_name(cls, prop_id):
+        """
+        :return: 词性编号对应的词性
+        """
+        return cls._props[prop_id]
+
+    def cut_file(self, file_path, chunk_size=1 << 20):
+        """
+        流式切分文件，分块读取，内存占用与文件大小无关
+        :param file_path: 文件路径
+        :param chunk_size: 每次读取的字数
+        :return: (词, 词性) 的迭代器
+        """
+        with jamen_utils.open_text(file_path) as file:
+            yield from self.cut_stream(file, chunk_size)
+
+    def cut_stream(self, stream, chunk_size=1 << 20):
+        """
+        流式切分文本流，结果与 cut_with_prop 一次切分全文完全一致。
+        每块只扫描新读入的部分，末尾的片段可能延续到下一块，留待下一块读入后再切分。
+        设置了 route_window 时，延续的中文片段逐窗口提交路径已确定的词，只留下未提交的尾部，
+        内存占用只取决于块大小与窗口大小；否则，或末尾是很长的非中文片段时，内存占用还取决于最长片段的长度
+        :param stream: 文本流，须支持 read(size)
+        :param chunk_size: 每次读取的字数
+        :return: (词, 词性) 的迭代器
+        """
+        carry = ''  # 末尾可能延续到下一块的片段
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                if carry:
+                    yield from self._cut_clip(carry)
+                return
 
-            if self._re_han.match(clip):
-                for frag, prop in self._cut_chn(clip, bond=False):
-                    yield frag, prop
+            # 末尾片段延续到新块中的部分
+            match = self._clip_run_regex(carry).match(chunk) if carry else None
+            n = match.end() if match else 0
+            if n < len(chunk):
+                if carry or n:
+                    yield from self._cut_clip(carry + chunk[:n])
+                last_start = n
+                for start, end in self._iter_clips(chunk, n):
+                    if start > last_start:
+                        yield from self._cut_clip(chunk[last_start:start])
+                    last_start = start
+                carry = chunk[last_start:]
             else:
-                yield clip, 'sym'
+                carry += chunk
+
+            if self.route_window and self._re_han.match(carry):
+                window = self._route_window_size()
+                pos = 0
+                while len(carry) - pos >= 2 * window:
+                    words = self._route_window_words(carry[pos:pos + 2 * window], window)
+                    yield from words
+                    pos += sum(len(word) for word, prop in words)
+                carry = carry[pos:]
+
+    def _clip_run_regex(self, clip):
+        """与片段同类的字符串的正则式：中文、英文数字或两者之外的字符"""
+        if self._re_han.match(clip):
+            return self._re_han
+        if self._re_alnum.match(clip):
+            return self._re_alnum
+        return self._re_gap
+
+    def _iter_clips(self, sentence, begin=0):
+        """
+        惰性地列举片段，与 _re_block.split 去掉空串后的结果一致，但不生成整个列表
+        :param begin: 开始扫描的位置
+        :return: (片段开始位置, 片段结束位置) 的迭代器
+        """
+        pos = begin
+        for match in self._re_block.finditer(sentence, begin):
+            if match.start() > pos:
+                yield pos, match.start()
+            yield match.start(), match.end()
+            pos = match.end()
+        if pos < len(sentence):
+            yield pos, len(sentence)
+
+    def _cut_clip(self, clip):
+        if self._re_eng.match(clip):
+            # 英文单词，直接入标签
+            yield clip, 'eng'
+        elif self._re_han.match(clip):
+            yield from self._cut_chn(clip, bond=False)
+        else:
+            yield clip, 'sym'
 
     def _cut_chn(self, clip, bond=False):
         """
@@ -168,152 +658,329 @@ class JamenCutter:
         :param bond: 是否黏合单字
         :return:
         """
-        dag = self._build_dag(clip)
-        route = self._calc_route(clip, dag)
-
-        i = 0
-        n = len(clip)
         buf = ''
-        while i < n:
-            j = route[i][1] + 1
-            frag = clip[i:j]
-            if bond and j == i + 1:
+        if self.route_window and len(clip) > self.route_window:
+            route = self._cut_route_windowed(clip)
+        else:
+            route = self._cut_route(clip)
+        for frag, prop in route:
+            if bond and len(frag) == 1:
                 buf += frag
             else:
                 if buf:
                     for t in self._cut_bonded(buf):
                         yield t, 'x'
                     buf = ''
-                yield frag, route[i][4]
-            i = j
+                yield frag, prop
         if buf:
             for t in self._cut_bonded(buf):
                 yield t, 'x'
 
+    def _cut_route(self, clip):
+        """
+        按最大概率路径切分中文片段，结果按片段缓存，词典改变后缓存作废
+        :param clip: 片段
+        :return: (词, 词性) 元组
+        """
+        words = self._get_cached_route(clip)
+        if words is None:
+            route_ends, route_prop_ids = self._calc_route(clip, self._build_dag(clip))
+            words = self._route_words(clip, 0, len(clip), route_ends, route_prop_ids)
+            self._put_cached_route(clip, words)
+        return words
+
+    def _cut_route_windowed(self, clip):
+        """
+        按窗口切分超长中文片段，逐窗口提交路径已确定的词。
+        没有边跨过的位置是所有路径的必经之处，其前后的最佳路径互不影响。
+        每个窗口构建 route_window 个位置的有向图，边可以延伸到窗口之外，
+        最后一个没有边跨过的位置之前的词即可提交，余下的留到下一个窗口；
+        整个窗口都找不到这样的位置时，按至多 2 倍窗口的文本计算路径，只提交前半个窗口的词，
+        片段不超过 2 倍窗口时结果仍与整段切分一致；更长的、处处有边跨过的片段（如成串的重复字）
+        最佳路径取决于片段全长，分段切分只是近似。
+        窗口不小于最长的词，边不会超出 2 倍窗口的文本
+        :param clip: 片段
+        :return: (词, 词性) 的迭代器
+        """
+        window = self._route_window_size()
+        begin = 0
+        while begin < len(clip):
+            sub = clip[begin:begin + 2 * window]
+            if len(sub) <= window:
+                yield from self._cut_route(sub)
+                return
+            words = self._route_window_words(sub, window)
+            yield from words
+            begin += sum(len(word) for word, prop in words)
+
+    def _route_window_words(self, sub, window):
+        """
+        提交一个窗口内路径已确定的词
+        :param sub: 从窗口开头起的文本，长于窗口时须取满 2 倍窗口（片段不足时取到片段结尾）
+        :param window: 窗口大小
+        :return: (词, 词性) 元组的列表，至少一个词
+        """
+        dag = self._build_dag(sub, 0, window, len(sub))
+        starts, ends = dag[0], dag[1]
+        cut = reach = 0
+        for i in range(window):
+            # 同一位置出发的边按终点升序存放，最后一条最长
+            reach = max(reach, ends[starts[i + 1] - 1] + 1)
+            if reach == i + 1:
+                cut = reach
+        forced = cut == 0
+        if forced:
+            dag = self._build_dag(sub, 0, len(sub))
+            cut = len(sub)
+
+        route_ends, route_prop_ids = self._calc_route(sub, dag, 0, cut)
+        words = []
+        pos = 0
+        for word in self._route_words(sub, 0, cut, route_ends, route_prop_ids):
+            if forced and pos >= max(1, window // 2):
+                break
+            words.append(word)
+            pos += len(word[0])
+        return words
+
+    def _route_window_size(self):
+        """
+        实际的分段窗口大小，不小于字典树、用户词叠加层中最长的词以及姓名自动机能匹配出的最长姓名
+        """
+        name_length = sum(trie.max_length() for trie in self._chinese_name_matcher._tries)
+        user_length = max(map(len, self._user_words), default=0)
+        return max(self.route_window, self._dict_trie.max_length(), name_length, user_length)
+
+    def _cut_routes(self, clips):
+        """
+        批量按最大概率路径切分多个中文片段。未命中缓存的片段拼接成一段文本，
+        各片段的有向图依次构建在同一组扁平数组中，再逐段计算路径，结果写入同一组路径数组
+        :param clips: 互不相同的片段列表
+        :return: 与 clips 一一对应的 (词, 词性) 元组列表
+        """
+        results = [self._get_cached_route(clip) for clip in clips]
+        missing = [k for k, words in enumerate(results) if words is None]
+        if not missing:
+            return results
+
+        text = ''.join(clips[k] for k in missing)
+        bounds = [0]
+        for k in missing:
+            bounds.append(bounds[-1] + len(clips[k]))
+        dag = None
+        for begin, end in zip(bounds, bounds[1:]):
+            dag = self._build_dag(text, begin, end)
+
+        route_ends = array('i', bytes(4 * len(text)))
+        route_prop_ids = array('i', bytes(4 * len(text)))
+        for k, begin, end in zip(missing, bounds, bounds[1:]):
+            self._calc_route(text, dag, begin, end, route_ends, route_prop_ids)
+            results[k] = self._route_words(text, begin, end, route_ends, route_prop_ids)
+            self._put_cached_route(clips[k], results[k])
+        return results
+
+    def _route_words(self, text, begin, end, route_ends, route_prop_ids):
+        """
+        按路径取出 [begin, end) 内的词
+        :return: (词, 词性) 元组
+        """
+        props = self._props
+        words = []
+        i = begin
+        while i < end:
+            j = route_ends[i] + 1
+            words.append((text[i:j], props[route_prop_ids[i]]))
+            i = j
+        return tuple(words)
+
+    def _get_cached_route(self, clip):
+        """
+        :return: 缓存的切分结果，未命中时为 None
+        """
+        if self._clip_cache_version != self._dict_version:
+            self._clip_cache.clear()
+            self._clip_cache_version = self._dict_version
+
+        words = self._clip_cache.get(clip)
+        if words is not None:
+            self._clip_cache.move_to_end(clip)
+            self._clip_cache_hits += 1
+            return words
+        self._clip_cache_misses += 1
+        return None
+
+    def _put_cached_route(self, clip, words):
+        if self.clip_cache_size > 0 and not self.debug_route:
+            self._clip_cache[clip] = words
+            if len(self._clip_cache) > self.clip_cache_size:
+                self._clip_cache.popitem(last=False)
+                self._clip_cache_evictions += 1
+
+    def clip_cache_stats(self):
+        """
+        片段缓存统计，用于按部署情况调整缓存大小
+        :return: 统计字典
+        """
+        return {
+            'size': len(self._clip_cache),
+            'capacity': self.clip_cache_size,
+            'hits': self._clip_cache_hits,
+            'misses': self._clip_cache_misses,
+            'evictions': self._clip_cache_evictions,
+        }
+
+    @profile('cutter.cut_bonded', items=lambda words, self, bonded_word: len(bonded_word))
     def _cut_bonded(self, bonded_word):
         if len(bonded_word) == 1:
-            yield bonded_word
-        else:
-            words = self._not_included_regex.split(bonded_word)
-            for word in words:
-                if word:
-                    yield word
+            return [bonded_word]
+        return [word for word in self._not_included_regex.split(bonded_word) if word]
 
-    def _build_dag(self, clip):
-        dag = {}
-        n = len(clip)
-        for i in range(n):
-            ends = []
-            dag[i] = ends
-            for j in range(i + 1, n + 1):
-                frag = clip[i:j]
+    @classmethod
+    def _get_prop_id(cls, prop):
+        prop_id = cls._prop_ids.get(prop)
+        if prop_id is None:
+            prop_id = cls._prop_ids[prop] = len(cls._props)
+            cls._props.append(prop)
+        return prop_id
+
+    @profile('cutter.build_dag', items=lambda dag, self, clip, begin=0, end=None, limit=None:
+             dag[0][len(clip) if end is None else end] - (dag[0][begin] if begin else 0))
+    def _build_dag(self, clip, begin=0, end=None, limit=None):
+        """
+        构建有向无环图，边存放在预分配的扁平数组中，各片段复用。
+        只构建 [begin, end) 内的边，下标为 clip 中的绝对位置；
+        多个片段拼接后可依次分段构建，各段的边接续存放，不会跨越段的边界
+        :param clip: 片段，或多个片段拼接成的文本
+        :param begin: 段的开始位置，大于0时接在上一段（须以 begin 结束）的边之后
+        :param end: 段的结束位置，默认为 clip 的结尾
+        :param limit: 边的终点上限（不含），默认为 end，大于 end 时边可以跨出段外
+        :return: (starts, ends, log_probs, prop_ids)，从 i 出发的边下标为 starts[i] 至 starts[i + 1]，
+                 ends 为边的终点（含），log_probs 为边的对数概率，prop_ids 为词性编号
+        """
+        n = len(clip) if end is None else end
+        limit = n if limit is None else limit
+        trie = self._dict_trie
+        base, check, codes = trie.base, trie.check, trie.codes
+        word_weights, word_props, name_weights, word_log_weights, name_log_weights = trie.values[:5]
+        n_codes, n_check = len(codes), len(check)
+        user_words = self._user_words
+        name_matcher = None  # 姓名自动机在第一次需要匹配姓名时才获取，由此才加载姓名词典
+        total_log_weight = log(self._chinese_words_total_weight)
+        nr = self._get_prop_id('nr')
+
+        if len(self._dag_starts) <= n:
+            self._dag_starts.extend(array('i', bytes(4 * (n + 1))))
+        starts, ends, log_probs, prop_ids = self._dag_starts, self._dag_ends, self._dag_log_probs, self._dag_prop_ids
+        m = starts[begin] if begin else 0
+        for i in range(begin, n):
+            starts[i] = m
+            if m + limit - i > len(ends):
+                # 从 i 出发的边不会多于 limit - i 条
+                grow = max(len(ends), limit - i)
+                ends.extend(array('i', bytes(4 * grow)))
+                log_probs.extend(array('d', bytes(8 * grow)))
+                prop_ids.extend(array('i', bytes(4 * grow)))
+
+            node = trie.ROOT  # 从 i 出发沿字典树前行，一次遍历找出所有以 i 开头的词
+            user_alive = bool(user_words)
+            chinese_names = None  # 以 i 开头的所有中文姓名，需要时再由自动机一次匹配出来
+            for j in range(i + 1, limit + 1):
+                if node >= 0:
+                    o = ord(clip[j - 1])
+                    t = base[node] + (codes[o] if o < n_codes else 0)
+                    node = t if t < n_check and check[t] == node else -1
 
                 # 普通词
-                word_weight, word_prop = self._chinese_words.get(frag, (-1, ''))
+                word_weight, word_log_weight, word_prop_id = -1, 0.0, 0
+                if node >= 0:
+                    word_weight, word_log_weight, word_prop_id = \
+                        word_weights[node], word_log_weights[node], word_props[node]
+                if user_alive:
+                    user_weight, user_prop = user_words.get(clip[i:j], (-1, ''))
+                    if user_weight > 0:
+                        word_weight, word_log_weight, word_prop_id = \
+                            user_weight, log(user_weight), self._get_prop_id(user_prop)
+                    elif user_weight < 0:
+                        user_alive = False
+                    elif word_weight < 0:
+                        word_weight = 0
                 if j == i + 1 or word_weight > 0:
-                    ends.append((j - 1, max(0, word_weight), word_prop))
+                    ends[m], log_probs[m], prop_ids[m] = j - 1, word_log_weight - total_log_weight, word_prop_id
+                    m += 1
                     continue
 
-                chinese_name_weight = self.match_chinese_name(frag)
+                if chinese_names is None:
+                    if name_matcher is None:
+                        name_matcher = self._chinese_name_matcher
+                    chinese_names = name_matcher.match(clip, i)
+                chinese_name_weight = chinese_names.get(j, -1)
                 if chinese_name_weight > 0:
-                    ends.append((j - 1, chinese_name_weight, 'nr'))
-                    continue
-
-                japanese_name_weight, prop = self._japanese_names.get(frag, (-1, ''))
-                if japanese_name_weight > 0:
-                    ends.append((j - 1, japanese_name_weight, 'nr'))
+                    ends[m], log_probs[m], prop_ids[m] = j - 1, log(chinese_name_weight) - total_log_weight, nr
+                    m += 1
                     continue
 
-                english_name_weight, prop = self._english_names.get(frag, (-1, ''))
-                if english_name_weight > 0:
-                    ends.append((j - 1, english_name_weight, 'nr'))
+                # 日文、英文等外文人名
+                if node >= 0 and name_weights[node] > 0:
+                    ends[m], log_probs[m], prop_ids[m] = j - 1, name_log_weights[node] - total_log_weight, nr
+                    m += 1
                     continue
 
-                if word_weight < 0 and chinese_name_weight < 0 and japanese_name_weight < 0 and english_name_weight < 0:
+                if word_weight < 0 and chinese_name_weight < 0:
                     break
-        return dag
+        starts[n] = m
+        return starts, ends, log_probs, prop_ids
 
-    # noinspection PyMethodMayBeStatic
-    def _calc_route(self, clip, dag):
-        route = {}
-        n = len(dag)
-        total_log_weight = log(self._chinese_words_total_weight)
-        route[n] = (0, 0, '', 0, '')  # 方便计算时不溢出
-        route_debug = {}
-        for i in range(n - 1, -1, -1):
+    @profile('cutter.calc_route', items=lambda route, self, clip, dag, begin=0, end=None, *args:
+             (len(clip) if end is None else end) - begin)
+    def _calc_route(self, clip, dag, begin=0, end=None, route_ends=None, route_prop_ids=None):
+        """
+        动态规划计算最大概率路径
+        :param clip: 片段，或多个片段拼接成的文本
+        :param dag: 有向无环图
+        :param begin: 段的开始位置
+        :param end: 段的结束位置，默认为 clip 的结尾
+        :param route_ends: 存放结果的数组，长度不小于 end，默认新建
+        :param route_prop_ids: 同上
+        :return: (route_ends, route_prop_ids)，从 i 出发的最佳词终点（含）及其词性编号，下标为 clip 中的绝对位置
+        """
+        starts, ends, log_probs, prop_ids = dag
+        n = len(clip) if end is None else end
+        epsilon = self.ROUTE_TIE_EPSILON
+        scores = array('d', bytes(8 * (n - begin + 1)))  # 段末为0，方便计算时不溢出
+        if route_ends is None:
+            route_ends = array('i', bytes(4 * n))
+            route_prop_ids = array('i', bytes(4 * n))
+        if self.debug_route:
+            self.route_debug = {}
+
+        for i in range(n - 1, begin - 1, -1):
             # jieba的处理参考
             # route[idx] = max((log(self.FREQ.get(sentence[idx:x + 1]) or 1) -
             #                   logtotal + route[x + 1][0], x) for x in DAG[idx])
+            # 每个终点只有一条边，按终点升序排列；分数在误差内相同时取较长的词，
+            # 分数从段末累加，段末不同时浮点误差不同，按精确相等判断会使分段切分与整段切分不一致
+            first, last = starts[i], starts[i + 1]
+            best_end = ends[first]
+            best_score = log_probs[first] + scores[best_end + 1 - begin]
+            best = first
+            for e in range(first + 1, last):
+                k = ends[e]
+                score = log_probs[e] + scores[k + 1 - begin]
+                if score >= best_score - epsilon:
+                    best_score, best_end, best = score, k, e
+            scores[i - begin] = best_score
+            route_ends[i] = best_end
+            route_prop_ids[i] = prop_ids[best]
 
-            # 动态规划，用词长做频度
-            # route[i] = max(((k - i + 1) + route[k + 1][0], k, clip[i:k + 1], weight, prop)
-            #                for k, weight, prop in dag[i])
-
-            # 向jieba妥协了
-            route[i] = max((log(weight or 1) - total_log_weight + route[k + 1][0], k, clip[i:k + 1], weight, prop)
-                           for k, weight, prop in dag[i])
+            if self.debug_route:
+                self.route_debug[i] = [(log_probs[e] + scores[ends[e] + 1 - begin], ends[e], clip[i:ends[e] + 1],
+                                        log_probs[e], self._props[prop_ids[e]]) for e in range(first, last)]
 
-            route_debug[i] = [(log(weight or 1) - total_log_weight + route[k + 1][0], k, clip[i:k + 1],
-                               log(weight or 1) - total_log_weight, prop) for k, weight, prop in dag[i]]
-
-        del (route[n])
-        return route
+        return route_ends, route_prop_ids
 
+    @profile('cutter.match_chinese_name')
     def match_chinese_name(self, str):
-        max_weight = -1
-        n = len(str)
-        for name_prefix, name_prefix_weight in self._match_prefix_dict(str, self._chinese_name_prefixes, 0):
-            i = len(name_prefix)
-
-            for family_name, family_name_weight in self._match_prefix_dict(str, self._chinese_family_names, i):
-                j = i + len(family_name)
-                if j == n:
-                    max_weight = max(max_weight, name_prefix_weight + family_name_weight)
-                    continue
-                elif family_name_weight == 0:
-                    continue
-                elif name_prefix and family_name:
-                    continue
-
-                for given_name, given_name_weight in self._match_prefix_dict(str, self._chinese_given_names, j):
-                    if name_prefix and not family_name and len(given_name) > 1:
-                        continue  # 前缀通常带单姓或单名或直接带后缀，不会带双名
-
-                    k = j + len(given_name)
-                    if k == n:
-                        max_weight = max(max_weight, name_prefix_weight + family_name_weight + given_name_weight)
-                        continue
-                    elif given_name_weight == 0:
-                        continue
-
-                    if name_prefix and family_name:
-                        continue  # 超过两个部分则已经是较完整名字，无须再带后缀
-                    elif given_name:
-                        continue  # 有名了也无须带后缀
-                    else:
-                        for name_suffix, suffix_weight in self._match_prefix_dict(str, self._chinese_name_suffixes, k):
-                            m = k + len(name_suffix)
-                            if m == n:
-                                max_weight = max(max_weight, name_prefix_weight +
-                                                 family_name_weight + given_name_weight + suffix_weight)
-
-        if max_weight > 0:
-            # 适当提高一点姓名的最低权重
-            max_weight = max(max_weight, 10)
-        if len(str) == 1:
-            max_weight = min(max_weight, 1)
-        return max_weight
-
-    @staticmethod
-    def _match_prefix_dict(str, prefix_dict, begin=0):
-        for end in range(begin + 1, len(str) + 1):
-            tmp = str[begin:end]
-            x, prop = prefix_dict.get(tmp, (-1, ''))
-            if x >= 0:
-                yield tmp, x
-            if x < 0:
-                break
-        yield '', 1
+        return self._chinese_name_matcher.match_whole(str)
 
     @staticmethod
     def list_sub_words(clip, min_length=2, max_length=7):
@@ -330,34 +997,91 @@ class JamenCutter:
                              begin + min(n - begin, max_length) + 1):
                 yield clip[begin:end]
 
-    def extract_names(self, sentence):
+    @profile('cutter.extract_names', items=lambda names, self, sentence, processes=1: len(sentence))
+    def extract_names(self, sentence, processes=1):
         """
         提炼姓名
         :param sentence:
+        :param processes: 进程数，大于1时按段落分片并行切分，None 表示使用全部CPU核
         :return:
         """
+        if processes == 1:
+            names = self._count_names(sentence)
+        else:
+            # 按分片顺序合并，保持名字首次出现的顺序，结果与单进程完全一致
+            names = {}
+            with self._create_pool(processes) as pool:
+                for shard_names in pool.imap(_count_names_shard, self._split_shards(sentence, processes)):
+                    for name, count in shard_names.items():
+                        names[name] = names.get(name, 0) + count
+
+        return self._merge_sub_names(names)
+
+    def _count_names(self, sentence):
         names = {}
         for tag, prop in [(tag, prop) for tag, prop in self.cut_with_prop(sentence) if prop == 'nr']:
             names[tag] = names.get(tag, 0) + 1
+        return names
 
+    @staticmethod
+    @profile('cutter.merge_sub_names', items=lambda result, names: len(names))
+    def _merge_sub_names(names):
         # 剔除一些跟高频名字粘结的低频名字，比如“秦海”与“秦海道”
+        # 用候选名字构建多模式匹配自动机，每个名字只访问真正包含在其中的候选名字，
+        # 访问顺序与逐一枚举子串相同：先长后短，同长度从左到右
+        index = AhoCorasick(name for name in names if len(name) > 1)
         for name, count in sorted(names.items(), key=lambda x: len(x[0]), reverse=True):
-            for n in range(len(name) - 1, 1, -1):
-                for b in range(0, len(name) - n + 1):
-                    sub_name = name[b:b + n]
-                    sub_name_count = names.get(sub_name, 0)
-                    if sub_name_count * 0.2 > count:
-                        names[name] = 0
-                        names[sub_name] = sub_name_count + count
+            for b, e in sorted(index.finditer(name), key=lambda x: (x[0] - x[1], x[0])):
+                if e - b == len(name):
+                    continue
+                sub_name = name[b:e]
+                sub_name_count = names[sub_name]
+                if sub_name_count * 0.2 > count:
+                    names[name] = 0
+                    names[sub_name] = sub_name_count + count
 
         return filter(lambda x: x[1] > 0, sorted(names.items(), key=lambda x: x[1], reverse=True))
 
+    def cut_corpus(self, sentence, processes=None):
+        """
+        多进程切分整本书，文本按段落分片交给进程池，结果按原文顺序返回，与 cut_with_prop 完全一致
+        :param sentence: 整本书的文本
+        :param processes: 进程数，None 表示使用全部CPU核
+        :return: (词, 词性) 的迭代器
+        """
+        with self._create_pool(processes) as pool:
+            for words in pool.imap(_cut_shard, self._split_shards(sentence, processes)):
+                yield from words
+
+    def _create_pool(self, processes=None):
+        """创建切分进程池，词典组在父进程中加载好，派生的工作进程直接继承，构造参数与用户词典同步到各工作进程"""
+        self.load_dict_groups()
+        options = {'debug_route': self.debug_route, 'clip_cache_size': self.clip_cache_size,
+                   'route_window': self.route_window}
+        return multiprocessing.Pool(processes, initializer=_init_worker,
+                                    initargs=(options, self._user_dicts))
+
+    def _split_shards(self, sentence, processes=None, shard_size=None):
+        """
+        将文本按段落切成分片，分片边界取在换行之后的第一个片段开头，
+        不会切断任何片段，各分片切分结果按顺序拼接后与整体切分完全一致
+        :param sentence: 文本
+        :param processes: 进程数，用于估算分片大小
+        :param shard_size: 分片的大致字数
+        :return: 分片的迭代器
+        """
+        if not shard_size:
+            shard_size = max(self.MIN_SHARD_SIZE, len(sentence) // ((processes or os.cpu_count() or 1) * 4))
+        return jamen_utils.split_shards(sentence, self._re_block, shard_size)
+
     def _zip_dict(self, dict):
+        index = AhoCorasick(k for k in dict if len(k) > 1)
         for key, count in [(k, c) for k, c in sorted(dict.items(), key=lambda x: len(x[0]), reverse=True)
                            if len(k) > 2]:
-            for sub_key in self.list_sub_words(key, 2, len(key) - 1):
-                sub_key_count = dict.get(sub_key, 0)
-                if count == sub_key_count and sub_key_count > 0:
+            for b, e in index.finditer(key):
+                sub_key = key[b:e]
+                sub_key_count = dict[sub_key]
+                if e - b < len(key) and count == sub_key_count and sub_key_count > 0:
                     dict[sub_key] = 0
 
     def pre_extract_names(self, sentence):
@@ -370,6 +1094,41 @@ class JamenCutter:
                 print(match_result.group(1) + "\t" + match_result.group(0))
 
 
+def _parse_dict(dict_path):
+    """
+    在独立进程中解析词典文件
+    :return: ({词: (权重, 词性)}, 耗时秒数, 内存增量字节数)
+    """
+    begin_time = time.perf_counter()
+    begin_rss = jamen_utils.get_rss()
+    words = {}
+    JamenCutter._load_dict(dict_path, words, with_prefix=False)
+    return words, time.perf_counter() - begin_time, jamen_utils.get_rss() - begin_rss
+
+
+_worker_cutter = None
+"""工作进程内的切分器"""
+
+
+def _init_worker(options, user_dicts):
+    """
+    :param options: 父进程切分器的构造参数
+    :param user_dicts: 父进程切分器的用户词典叠加层
+    """
+    global _worker_cutter
+    _worker_cutter = JamenCutter(**options)
+    for layer, user_dict in user_dicts.items():
+        _worker_cutter.add_words(((word, weight, prop) for word, (weight, prop) in user_dict.items()), layer)
+
+
+def _cut_shard(shard):
+    return list(_worker_cutter.cut_with_prop(shard))
+
+
+def _count_names_shard(shard):
+    return _worker_cutter._count_names(shard)
+
+
 if __name__ == '__main__':
     begin_time = time.perf_counter()
     cutter = JamenCutter()
@@ -0,0 +1,88 @@
+"""
+流水线各阶段的性能计数
+"""
+import functools
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    """
+    按阶段累计调用次数、耗时与处理的条目数（如构建的有向图边数、尝试匹配姓名的位置数）。
+
+    默认关闭，关闭时被计数的函数只多一次开关判断；可调用 enable() 打开，
+    或在启动前设置环境变量 JAMEN_PROFILE=1
+    """
+
+    enabled = os.environ.get('JAMEN_PROFILE', '') not in ('', '0')
+    _stats = {}
+    """阶段 -> [调用次数, 耗时秒数, 条目数]"""
+
+    @classmethod
+    def enable(cls, enabled=True):
+        cls.enabled = enabled
+
+    @classmethod
+    def reset(cls):
+        cls._stats.clear()
+
+    @classmethod
+    def record(cls, stage, seconds, items=0, calls=1):
+        """
+        累计一个阶段的计数
+        :param stage: 阶段名
+        :param seconds: 耗时秒数
+        :param items: 处理的条目数
+        :param calls: 调用次数
+        """
+        stat = cls._stats.get(stage)
+        if stat is None:
+            stat = cls._stats[stage] = [0, 0.0, 0]
+        stat[0] += calls
+        stat[1] += seconds
+        stat[2] += items
+
+    @classmethod
+    def stats(cls):
+        """
+        :return: {阶段: {'calls': 调用次数, 'seconds': 耗时秒数, 'items': 条目数}}，按耗时倒序
+        """
+        return {stage: {'calls': calls, 'seconds': seconds, 'items': items}
+                for stage, (calls, seconds, items) in sorted(cls._stats.items(), key=lambda x: x[1][1], reverse=True)}
+
+    @classmethod
+    def dump(cls, path):
+        """把计数保存为 JSON 文件"""
+        with open(path, 'w', encoding='UTF-8') as file:
+            json.dump(cls.stats(), file, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def log_stats(cls):
+        for stage, stat in cls.stats().items():
+            logger.info(f"{stage}: calls: {stat['calls']}, time cost: {stat['seconds']:.3f}s, items: {stat['items']}")
+
+
+def profile(stage, items=None):
+    """
+    阶段计数装饰器，只适用于普通函数，生成器的耗时发生在迭代时，计不到
+    :param stage: 阶段名
+    :param items: 计算条目数的函数，参数为被装饰函数的返回值及其参数
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not Profiler.enabled:
+                return func(*args, **kwargs)
+            begin_time = time.perf_counter()
+            result = func(*args, **kwargs)
+            Profiler.record(stage, time.perf_counter() - begin_time, items(result, *args, **kwargs) if items else 0)
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,303 @@
+# encoding=utf-8
+"""
+本地分词服务
+
+常驻进程，词典只加载一次。并发的小请求先攒成批，再交给预热好的切分进程池处理，
+等待队列满时直接拒绝（503），由调用方稍后重试。
+
+请求：POST /cut、/cut_with_prop、/extract_names、/match_chinese_name，请求体为 {"text": "..."}，
+返回 {"result": ...}；GET /stats 返回请求数、批大小及请求延迟的分位数
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jamen_cutter
+from jamen_cutter import JamenCutter
+
+logging.basicConfig(
+    stream=sys.stderr,
+    level=logging.DEBUG,
+    format='%(asctime)s.%(msecs)03d %(filename)s: %(levelname)s %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+METHODS = ('cut', 'cut_with_prop', 'extract_names', 'match_chinese_name')
+
+
+class _Request:
+    __slots__ = ('method', 'text', 'begin_time', 'done', 'ok', 'result')
+
+    def __init__(self, method, text):
+        self.method = method
+        self.text = text
+        self.begin_time = time.perf_counter()
+        self.done = threading.Event()
+        self.ok = False
+        self.result = None
+
+
+class LatencyStats:
+    """请求延迟统计，保留最近的若干个样本计算分位数"""
+
+    def __init__(self, max_samples=10000):
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self.counts = {'requests': 0, 'rejected': 0, 'errors': 0, 'timeouts': 0, 'batches': 0, 'batched_requests': 0}
+
+    def count(self, key, n=1):
+        with self._lock:
+            self.counts[key] += n
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentiles(self, ps=(50, 90, 99)):
+        """
+        :return: {'p50': 毫秒数, ...}，没有样本时为0
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {f"p{p}": 0 for p in ps}
+        return {f"p{p}": samples[min(len(samples) - 1, len(samples) * p // 100)] * 1000 for p in ps}
+
+    def report(self):
+        with self._lock:
+            counts = dict(self.counts)
+        counts['avg_batch_size'] = counts['batched_requests'] / counts['batches'] if counts['batches'] else 0
+        counts['latency_ms'] = self.percentiles()
+        return counts
+
+
+class BatchDispatcher:
+    """
+    请求攒批分发器：请求进入有界队列，分发线程把一段时间内到达的请求攒成一批，交给切分进程池。
+    在途的批数有上限，进程池忙不过来时队列随之积压，积满后新请求被拒绝
+    """
+
+    def __init__(self, cutter, processes=None, batch_size=64, batch_chars=20000, batch_wait=0.002,
+                 max_pending=1024):
+        """
+        :param cutter: 切分器，其用户词典叠加层会同步到各工作进程
+        :param processes: 工作进程数，None 表示使用全部CPU核
+        :param batch_size: 每批最多的请求数
+        :param batch_chars: 每批最多的字数，超出后不再往批里加请求，单个长文本独自成批
+        :param batch_wait: 攒批时最多等待的秒数
+        :param max_pending: 等待队列的长度上限
+        """
+        processes = processes or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch_chars = batch_chars
+        self.batch_wait = batch_wait
+        self.stats = LatencyStats()
+        self._queue = queue.Queue(max_pending)
+        self._in_flight = threading.BoundedSemaphore(processes * 2)
+        self._pool = cutter._create_pool(processes)
+        self._closed = False
+        self._thread = threading.Thread(target=self._dispatch, name='batch-dispatcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, method, text):
+        """
+        提交请求
+        :return: 请求对象，其 done 事件置位后 ok、result 有效
+        :raise queue.Full: 等待队列已满
+        """
+        request = _Request(method, text)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            self.stats.count('rejected')
+            raise
+        return request
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _dispatch(self):
+        while not self._closed:
+            try:
+                batch = [self._queue.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            chars = len(batch[0].text)
+            deadline = time.perf_counter() + self.batch_wait
+            while len(batch) < self.batch_size and chars < self.batch_chars:
+                timeout = deadline - time.perf_counter()
+                try:
+                    request = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(request)
+                chars += len(request.text)
+
+            self._in_flight.acquire()
+            self.stats.count('batches')
+            self.stats.count('batched_requests', len(batch))
+            self._pool.apply_async(_run_batch, ([(r.method, r.text) for r in batch],),
+                                   callback=lambda results, batch=batch: self._finish(batch, results),
+                                   error_callback=lambda e, batch=batch: self._finish(
+                                       batch, [(False, f"{type(e).__name__}: {e}")] * len(batch)))
+
+    def _finish(self, batch, results):
+        self._in_flight.release()
+        end_time = time.perf_counter()
+        for request, (ok, result) in zip(batch, results):
+            request.ok, request.result = ok, result
+            if not ok:
+                self.stats.count('errors')
+            self.stats.add(end_time - request.begin_time)
+            request.done.set()
+
+    def close(self):
+        self._closed = True
+        self._thread.join()
+        self._pool.terminate()
+        self._pool.join()
+
+
+def _run_batch(batch):
+    """
+    在工作进程中处理一批请求，单个请求出错不影响同批的其它请求
+    :param batch: [(方法名, 文本), ...]，方法名为 cut、cut_with_prop、extract_names、match_chinese_name 之一
+    :return: [(是否成功, 结果或错误信息), ...]
+    """
+    cutter = jamen_cutter._worker_cutter  # 由进程池的初始化函数在工作进程中创建
+    results = []
+    for method, text in batch:
+        try:
+            if method == 'match_chinese_name':
+                result = cutter.match_chinese_name(text)
+            else:
+                result = list(getattr(cutter, method)(text))
+            results.append((True, result))
+        except Exception as e:
+            logger.exception(f"{method} failed")
+            results.append((False, f"{type(e).__name__}: {e}"))
+    return results
+
+
+class JamenRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    request_timeout = 60
+    """等待处理结果的秒数，超时返回504"""
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            stats = self.server.dispatcher.stats.report()
+            stats['pending'] = self.server.dispatcher.pending()
+            self._send(200, stats)
+        else:
+            self._send(404, {'error': f"unknown path '{self.path}'"})
+
+    def do_POST(self):
+        method = self.path.strip('/')
+        if method not in METHODS:
+            self._send(404, {'error': f"unknown method '{method}'"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+            text = body['text']
+            if not isinstance(text, str):
+                raise TypeError("'text' must be a string")
+        except (ValueError, KeyError, TypeError) as e:
+            self._send(400, {'error': f"bad request: {e}"})
+            return
+
+        dispatcher = self.server.dispatcher
+        dispatcher.stats.count('requests')
+        try:
+            request = dispatcher.submit(method, text)
+        except queue.Full:
+            self._send(503, {'error': 'server busy'}, {'Retry-After': '1'})
+            return
+        if not request.done.wait(self.request_timeout):
+            dispatcher.stats.count('timeouts')
+            self._send(504, {'error': 'timeout'})
+        elif request.ok:
+            self._send(200, {'result': request.result})
+        else:
+            self._send(500, {'error': request.result})
+
+    def _send(self, code, obj, headers=None):
+        body = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class JamenServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, dispatcher):
+        """
+        :param address: (主机, 端口)，或 Unix 套接字文件路径
+        :param dispatcher: 请求攒批分发器
+        """
+        self.dispatcher = dispatcher
+        if isinstance(address, str):
+            self.address_family = socket.AF_UNIX
+            if os.path.exists(address):
+                os.remove(address)
+        super().__init__(address, JamenRequestHandler)
+
+    def server_bind(self):
+        if self.address_family == socket.AF_UNIX:
+            # HTTPServer.server_bind 要解析主机名和端口，Unix 套接字没有
+            socketserver.TCPServer.server_bind(self)
+            self.server_name, self.server_port = self.server_address, 0
+        else:
+            super().server_bind()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JamenCutter 本地分词服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='监听 Unix 套接字文件，指定后忽略 --host 与 --port')
+    parser.add_argument('--processes', type=int, help='工作进程数，默认使用全部CPU核')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--batch-wait-ms', type=float, default=2)
+    parser.add_argument('--max-pending', type=int, default=1024)
+    parser.add_argument('--user-dict', action='append', default=[], help='用户词典，可多次指定')
+    args = parser.parse_args()
+
+    cutter = JamenCutter()
+    for dict_path in args.user_dict:
+        cutter.load_user_dict(dict_path)
+    cutter.preload()  # 常驻服务只在启动时冻结一次，派生的工作进程共享词典所在的页
+    dispatcher = BatchDispatcher(cutter, args.processes, args.batch_size, batch_wait=args.batch_wait_ms / 1000,
+                                 max_pending=args.max_pending)
+    server = JamenServer(args.unix or (args.host, args.port), dispatcher)
+    logger.info(f"serving on {args.unix or f'http://{args.host}:{args.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        dispatcher.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,9 @@
 """
 文本阅读
 """
+import codecs
 import os
+import sys
 
 
 def load_text(text_path):
@@ -13,6 +15,44 @@ def load_text(text_path):
             return file.read()
 
 
+def open_text(text_path, chunk_size=1 << 20):
+    """
+    打开文本文件用于流式读取，编码判断规则与 load_text 一致，但只分块扫描，不把整个文件读入内存
+    :param text_path: 文件路径
+    :param chunk_size: 扫描时每次读取的字节数
+    :return: 文本文件对象
+    """
+    decoder = codecs.getincrementaldecoder('UTF-8')()
+    try:
+        with open(text_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                decoder.decode(chunk)
+            decoder.decode(b'', final=True)
+        return open(text_path, 'r', encoding='UTF-8')
+    except UnicodeDecodeError:
+        return open(text_path, 'r', encoding='gb18030', errors='ignore')
+
+
+def split_shards(text, block_regex, shard_size):
+    """
+    将文本按段落切成分片，分片边界取在换行之后的第一个块开头，不会切断任何块
+    :param text: 文本
+    :param block_regex: 块（不含标点的片段）的正则式
+    :param shard_size: 分片的大致字数
+    :return: 分片的迭代器
+    """
+    begin = 0
+    n = len(text)
+    while begin < n:
+        end = text.find('\n', begin + shard_size)
+        match = block_regex.search(text, end) if end >= 0 else None
+        if not match:
+            yield text[begin:]
+            break
+        yield text[begin:match.start()]
+        begin = match.start()
+
+
 def makesure_dir(dir_path):
     """
     确保目录存在
@@ -21,3 +61,55 @@ def makesure_dir(dir_path):
     """
     if not os.path.exists(dir_path):
         os.makedirs(dir_path)
+
+
+def iter_dict(dict_path):
+    """
+    逐行读取词典，每行为“词 权重 词性”，权重缺省为1，词性缺省为x，忽略空行及 # 开头的注释
+    :return: (词, 权重, 词性) 的迭代器
+    """
+    with open(dict_path, 'r', encoding='UTF-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[:1] == '#':
+                continue
+
+            word, weight, prop = (line + ' 1 x').split(' ')[:3]
+            yield word, int(float(weight)), prop
+
+
+def get_rss():
+    """
+    获取当前进程的常驻内存
+    :return: 字节数，无法获取当前值时（如 Windows、macOS）返回0，峰值不能代替当前值求增量
+    """
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def get_peak_rss():
+    """
+    获取当前进程的常驻内存峰值
+    :return: 字节数，无法获取时（如 Windows）返回0
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # macOS 上单位为字节，Linux 上为KB
+
+
+def get_private_memory():
+    """
+    获取当前进程独占的内存，即未与其它进程共享的页，派生出的子进程写时复制产生的页计入其中
+    :return: 字节数，无法获取时返回0
+    """
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as file:
+            return sum(int(line.split()[1]) * 1024 for line in file if line.startswith(('Private_Clean', 'Private_Dirty')))
+    except OSError:
+        return 0
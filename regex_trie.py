@@ -0,0 +1,257 @@
+"""
+由一组正则式编译成的字典树正则式
+"""
+import re
+
+MAX_EXPANSIONS = 10000
+"""单个正则式展开成的字符串数上限，超过的留给正则引擎按原样匹配"""
+
+_SPECIAL_CHARS = set('.^$*+?{}[]\\|()')
+
+
+def load_patterns(dict_path):
+    """
+    加载正则式文件，每行一个，忽略空行及 # 开头的注释
+    :return: 正则式列表
+    """
+    with open(dict_path, 'r', encoding='UTF-8') as f:
+        return [exp for exp in [l.strip() for l in f if l.strip()] if exp[:1] != '#']
+
+
+def compile_patterns(patterns, group=False):
+    """
+    把一组正则式编译成与 '|'.join(patterns) 完全等价的正则式。
+
+    只由字符、字符集与可选（?）组成的有限正则式，展开成字符串后并入字典树，
+    相邻的有限正则式合并成一个按首字分支的正则式，每个位置上不再逐一尝试几十个分支；
+    含 +、*、锚点等的正则式原样保留。正则引擎在每个位置按顺序尝试各分支，取第一个能匹配的，
+    字典树的分支次序按展开时的回溯次序排定，匹配结果与原正则式完全一致
+    :param patterns: 正则式列表，排在前面的优先
+    :param group: 是否把整个正则式放进捕获组，split 时保留分隔符
+    :return: 编译好的正则式
+    """
+    alternatives = [alt for pattern in patterns for alt in _split_alternatives(pattern)]
+    parts = []
+    run = []
+    for alt in alternatives + [None]:
+        expansions = _expand(alt) if alt is not None else None
+        if expansions is not None:
+            run.append((alt, expansions))
+            continue
+        if run:
+            parts += _compile_run(run)
+            run = []
+        if alt is not None:
+            parts.append(alt)
+
+    reg_str = '|'.join(parts)
+    return re.compile(f"({reg_str})" if group else reg_str, re.U)
+
+
+def _split_alternatives(pattern):
+    """按顶层的 | 拆分正则式"""
+    alternatives = []
+    begin = 0
+    depth = 0
+    i = 0
+    n = len(pattern)
+    while i < n:
+        ch = pattern[i]
+        if ch == '\\':
+            i += 1
+        elif ch == '[':
+            i = _class_end(pattern, i)
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == '|' and depth == 0:
+            alternatives.append(pattern[begin:i])
+            begin = i + 1
+        i += 1
+    alternatives.append(pattern[begin:])
+    return alternatives
+
+
+def _class_end(pattern, begin):
+    """字符集 [...] 的结束位置"""
+    i = begin + 1
+    if i < len(pattern) and pattern[i] == '^':
+        i += 1
+    if i < len(pattern) and pattern[i] == ']':
+        i += 1
+    while i < len(pattern) and pattern[i] != ']':
+        if pattern[i] == '\\':
+            i += 1
+        i += 1
+    return i
+
+
+def _parse_class(body):
+    """
+    解析字符集内容
+    :return: 字符列表，含取反、\\d 之类的类别时返回 None
+    """
+    if body[:1] == '^':
+        return None
+    chars = []
+    i = 0
+    while i < len(body):
+        ch = body[i]
+        if ch == '\\':
+            i += 1
+            if i >= len(body) or body[i].isalnum():
+                return None
+            ch = body[i]
+        if i + 2 < len(body) and body[i + 1] == '-':
+            last = body[i + 2]
+            if last == '\\' or ord(last) - ord(ch) > 256:
+                return None
+            chars += [chr(o) for o in range(ord(ch), ord(last) + 1)]
+            i += 3
+            continue
+        chars.append(ch)
+        i += 1
+    return chars
+
+
+def _parse_atoms(alt):
+    """
+    把有限正则式解析成原子序列
+    :return: [(字符列表, 是否可选), ...]，不是有限正则式时返回 None
+    """
+    atoms = []
+    i = 0
+    n = len(alt)
+    while i < n:
+        ch = alt[i]
+        if ch == '[':
+            end = _class_end(alt, i)
+            if end >= n:
+                return None
+            chars = _parse_class(alt[i + 1:end])
+            i = end + 1
+        elif ch == '\\':
+            if i + 1 >= n or alt[i + 1].isalnum():
+                return None
+            chars = [alt[i + 1]]
+            i += 2
+        elif ch in _SPECIAL_CHARS:
+            return None
+        else:
+            chars = [ch]
+            i += 1
+        if not chars:
+            return None
+
+        optional = i < n and alt[i] == '?'
+        if optional:
+            i += 1
+        if i < n and alt[i] in '*+?{':
+            # 非贪婪、占有等量词不展开
+            return None
+        atoms.append((list(dict.fromkeys(chars)), optional))
+    return atoms
+
+
+def _expand(alt):
+    """
+    展开有限正则式
+    :return: 按回溯次序（深度优先，可选的原子先取后舍）排列的字符串列表；不是有限正则式、能匹配空串或展开过多时返回 None
+    """
+    atoms = _parse_atoms(alt)
+    if not atoms:
+        return None
+    count = 1
+    for chars, optional in atoms:
+        count *= len(chars) + optional
+        if count > MAX_EXPANSIONS:
+            return None
+
+    expansions = []
+
+    def visit(i, prefix):
+        if i == len(atoms):
+            expansions.append(prefix)
+            return
+        chars, optional = atoms[i]
+        # 字符集内各字符互斥，同一位置上最多一个能匹配，次序无关
+        for ch in chars:
+            visit(i + 1, prefix + ch)
+        if optional:
+            visit(i + 1, prefix)
+
+    visit(0, '')
+    if '' in expansions:
+        return None
+    return expansions
+
+
+class _Node:
+    __slots__ = ('children', 'rank')
+
+    def __init__(self):
+        self.children = {}
+        self.rank = None
+        """以此结点结尾的字符串中最优先的次序，不是结尾则为 None"""
+
+
+def _compile_run(run):
+    """
+    把相邻的有限正则式合并成一个字典树正则式
+    :param run: [(正则式, 展开的字符串列表), ...]
+    :return: 正则式列表，字典树无法保持匹配次序时原样返回各正则式
+    """
+    root = _Node()
+    rank = 0
+    for alt, expansions in run:
+        for word in expansions:
+            node = root
+            for ch in word:
+                node = node.children.setdefault(ch, _Node())
+            if node.rank is None:
+                node.rank = rank
+            rank += 1
+    try:
+        return [_node_pattern(root)[0]]
+    except ValueError:
+        return [alt for alt, expansions in run]
+
+
+def _node_pattern(node):
+    """
+    :return: (子树的正则式, 子树中最小次序, 子树中最大次序)
+    :raise ValueError: 某个结点的结尾次序夹在其子树的次序之间，无法用先取后舍或先舍后取表达
+    """
+    suffixes = {}
+    min_rank, max_rank = None, None
+    for ch in sorted(node.children):
+        child = node.children[ch]
+        if child.children:
+            sub_pattern, sub_min, sub_max = _node_pattern(child)
+            if child.rank is None:
+                suffix = sub_pattern
+            elif child.rank > sub_max:
+                suffix = f"(?:{sub_pattern})?"  # 长的优先
+            elif child.rank < sub_min:
+                suffix = f"(?:{sub_pattern})??"  # 短的优先
+            else:
+                raise ValueError(f"ambiguous order at '{ch}'")
+            ranks = [sub_min, sub_max] + ([child.rank] if child.rank is not None else [])
+        else:
+            suffix = ''
+            ranks = [child.rank]
+        min_rank = min(ranks + ([min_rank] if min_rank is not None else []))
+        max_rank = max(ranks + ([max_rank] if max_rank is not None else []))
+        # 同一结点的各分支首字不同，互斥，子树相同的分支可以合并成字符集
+        suffixes.setdefault(suffix, []).append(ch)
+
+    alternatives = [_char_class(chars) + suffix for suffix, chars in suffixes.items()]
+    pattern = alternatives[0] if len(alternatives) == 1 else f"(?:{'|'.join(alternatives)})"
+    return pattern, min_rank, max_rank
+
+
+def _char_class(chars):
+    if len(chars) == 1:
+        return re.escape(chars[0])
+    return f"[{''.join(re.escape(ch) for ch in chars)}]"
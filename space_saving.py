@@ -0,0 +1,74 @@
+"""
+有界内存的高频项统计
+"""
+
+
+class SpaceSaving:
+    """
+    Space-Saving 高频项统计：只用固定个数的计数器，近似统计数据流中各项的出现次数
+
+    计数器用满后，新项顶替次数最少的项，并继承其次数再加1。记下的次数只会偏高，偏高量不超过顶替时继承的次数；
+    真实次数超过 总次数 / 容量 的项一定在列。计数器按次数分桶，每次计数都是常数时间
+    """
+
+    def __init__(self, capacity):
+        """
+        :param capacity: 计数器个数
+        """
+        if capacity <= 0:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+        self.capacity = capacity
+        self.total = 0
+        """累计计数次数"""
+        self._counts = {}
+        """项 -> 记下的次数"""
+        self._errors = {}
+        """项 -> 顶替时继承的次数，即记下的次数最多偏高多少"""
+        self._buckets = {}
+        """次数 -> {项: None}，同一桶内按进入的先后排列，顶替时取最早进入的"""
+        self._min_count = 0
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __contains__(self, item):
+        return item in self._counts
+
+    def add(self, item):
+        """计数一次"""
+        self.total += 1
+        buckets = self._buckets
+        count = self._counts.get(item)
+        if count is None:
+            count = error = 0
+            if len(self._counts) >= self.capacity:
+                bucket = buckets[self._min_count]
+                victim = next(iter(bucket))
+                del bucket[victim]
+                if not bucket:
+                    del buckets[self._min_count]
+                count = error = self._counts.pop(victim)
+                del self._errors[victim]
+            self._errors[item] = error
+        else:
+            bucket = buckets[count]
+            del bucket[item]
+            if not bucket:
+                del buckets[count]
+
+        count += 1
+        self._counts[item] = count
+        bucket = buckets.get(count)
+        if bucket is None:
+            bucket = buckets[count] = {}
+        bucket[item] = None
+        if count == 1 or (count - 1 == self._min_count and self._min_count not in buckets):
+            self._min_count = count
+
+    def items(self):
+        """
+        :return: (项, 记下的次数, 最大偏高量) 的迭代器
+        """
+        errors = self._errors
+        for item, count in self._counts.items():
+            yield item, count, errors[item]
@@ -10,6 +10,7 @@ import jamen_utils
 from baidu_speech import BaiduSpeech
 from double_linked_node import DoubleLinkedListNode
 from jamen_cutter import JamenCutter
+from jamen_profiler import profile
 
 logging.basicConfig(
     stream=sys.stderr,
@@ -78,6 +79,7 @@ class StoryTeller:
     voiceover_tone = BaiduSpeech.Tone(pit=3)
     dialogues = None
 
+    @profile('story.analyse', items=lambda result, self, sentence: len(sentence))
     def analyse(self, sentence):
         self.names = {k: v for k, v in self.name_cutter.extract_names(sentence)}
 
@@ -102,6 +104,7 @@ class StoryTeller:
         self.name_cutter.add_word(word, weight, prop)
 
     @staticmethod
+    @profile('story.split_to_double_linked')
     def split_to_double_linked(sentence):
         """
         将多行文本拆分成对白片段，装入双链表
@@ -128,6 +131,7 @@ class StoryTeller:
     def get_dialogues(self):
         return self.dialogues.nodes() if self.dialogues else None
 
+    @profile('story.complete_speaker')
     def complete_speaker(self, node):
         """
         通过上下文内容完善指定结点的发言人
@@ -233,6 +237,7 @@ class StoryTeller:
                 yield clip[begin:end]
 
     @staticmethod
+    @profile('story.combine_over_voice')
     def combine_over_voice(node):
         """
         从指定节点开始合并同一行内的画外音
@@ -1,10 +1,17 @@
 # encoding=utf-8
 import logging
+import multiprocessing
+import os
 import re
 import sys
 import time
 
 import jamen_utils
+import regex_trie
+from aho_corasick import AhoCorasick
+from jamen_cutter import JamenCutter
+from jamen_profiler import profile
+from space_saving import SpaceSaving
 
 logging.basicConfig(
     stream=sys.stderr,
@@ -21,44 +28,31 @@ class TagAnalyzer:
     __re_han = re.compile("[\u4E00-\u9FD5]+", re.U)
     MIN_HAN_WORD_LENGTH = 2
     MAX_HAN_WORD_LENGTH = 7
+    MIN_SHARD_SIZE = 10000
+    """并行统计时分片的最小字数"""
+    DICT_PATH_LIST = [
+        'dict/chinese.dict',
+        'dict/chinese_regions.dict',
+        'dict/world_countries.dict',
+        'dict/chinese_colleges.dict',
+    ]
+    """标签词典，与 JamenCutter 共用同一棵已加载的字典树"""
 
     __extra_stop_words = set()
     """精确停止词，完全相等就算"""
     __stop_regex = re.compile("")
     """停止词正则式"""
 
-    __dict = {}  # 完整字典
+    __dict = None
+    """完整字典，共享词典中标签词典、长度在范围内的词构成的视图"""
     __tags = {}
 
     def __init__(self):
-        self.__load_dict('dict\\chinese.dict')
-        self.__load_dict('dict\\chinese_regions.dict')
-        self.__load_dict('dict\\world_countries.dict')
-        self.__load_dict('dict\\chinese_colleges.dict')
-        self.__load_extra_stop_words('dict\\chinese_stop_words.dict')
-        self.__load_stop_words_regex('data\\not_included_regexps.txt')
+        self.__dict = JamenCutter().dict_view(self.DICT_PATH_LIST, self.MIN_HAN_WORD_LENGTH, self.MAX_HAN_WORD_LENGTH)
+        self.__load_extra_stop_words('dict/chinese_stop_words.dict')
+        self.__load_stop_words_regex('data/not_included_regexps.txt')
         logger.info(f"stop words count: {len(self.__extra_stop_words)}")
 
-    def __load_dict(self, dict_path):
-        logger.debug(f"load dict['{dict_path}']...")
-        with open(dict_path, 'r', encoding='UTF-8') as f:
-            for word in [l.strip() for l in f if l.strip()]:
-                if word[:1] == '#':
-                    # 忽略注释
-                    continue
-
-                if len(word) > self.MAX_HAN_WORD_LENGTH:
-                    continue
-
-                self.__dict[word] = 1
-
-                # 将不完整的词也加入词典，方便搜索
-                for i in range(self.MIN_HAN_WORD_LENGTH, len(word)):
-                    frag = word[:i]
-                    if frag not in self.__dict.keys():
-                        self.__dict[frag] = 0  # 不完整的词权重为0
-        logger.debug(f"load dict['{dict_path}'] done, size: {len(self.__dict)} ")
-
     def __load_extra_stop_words(self, dict_path):
         """加载精确停止词字典"""
         with open(dict_path, 'r', encoding='UTF-8') as f:
@@ -67,35 +61,166 @@ class TagAnalyzer:
                 # self.__dict[word] = 1
 
     def __load_stop_words_regex(self, dict_path):
-        """加载模糊停止词正则式"""
-        reg_str = ""
-        with open(dict_path, 'r', encoding='UTF-8') as f:
-            for exp in [l.strip() for l in f if l.strip()]:
-                if exp[:1] == '#':
-                    # 忽略注释
-                    continue
-
-                if len(reg_str) != 0:
-                    reg_str += '|'
-                reg_str += exp
-        # self.__stop_regex = re.compile(f"({reg_str})", re.U)
-        self.__stop_regex = re.compile(f"{reg_str}", re.U)
-
-    def analyse(self, sentence):
+        """加载模糊停止词正则式，有限的正则式合并成字典树，匹配结果与逐一拼接的正则式相同"""
+        self.__stop_regex = regex_trie.compile_patterns(regex_trie.load_patterns(dict_path))
+
+    @profile('tag.analyse', items=lambda result, self, sentence, processes=1, max_tags=None: len(sentence))
+    def analyse(self, sentence, processes=1, max_tags=None):
+        """
+        分析标签
+        :param sentence: 文本
+        :param processes: 进程数，大于1时按段落分片，在工作进程中并行统计标签次数，
+                          按分片顺序合并后再统一过滤，结果与单进程完全一致；None 表示使用全部CPU核
+        :param max_tags: 不为 None 时以有界内存模式单进程统计，最多同时统计这么多个标签，见 __count_tags_bounded
+        """
         logger.info("build tags...")
-        self.__build_tags(sentence)
+        if max_tags:
+            self.__merge_tags(self.__count_tags_bounded(lambda: [sentence], max_tags))
+        elif processes == 1:
+            self.__build_tags(sentence, self.__tags)
+        else:
+            self.__merge_tags(self.count_tags(sentence, processes))
         logger.info("build tags done")
+        self.__extract_tags()
 
+    def analyse_file(self, file_path, max_tags=None, chunk_size=1 << 20):
+        """
+        流式分析文本文件，按行分块读取，不把整个文件读入内存，结果与 analyse 整个文件的内容完全一致
+        :param file_path: 文件路径
+        :param max_tags: 不为 None 时以有界内存模式统计，见 __count_tags_bounded
+        :param chunk_size: 每次读取的字数
+        """
+        logger.info("build tags...")
+        if max_tags:
+            self.__merge_tags(self.__count_tags_bounded(lambda: self.__iter_file_chunks(file_path, chunk_size),
+                                                        max_tags))
+        else:
+            for chunk in self.__iter_file_chunks(file_path, chunk_size):
+                self.__build_tags(chunk, self.__tags)
+        logger.info("build tags done")
+        self.__extract_tags()
+
+    @staticmethod
+    def __iter_file_chunks(file_path, chunk_size):
+        """
+        分块读取文件，块的边界取在换行之后，不会切断任何片段
+        :return: 文本块的迭代器
+        """
+        with jamen_utils.open_text(file_path) as file:
+            carry = ''
+            while True:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    if carry:
+                        yield carry
+                    return
+                text = carry + chunk
+                end = text.rfind('\n') + 1
+                carry = text[end:]
+                if end:
+                    yield text[:end]
+
+    @profile('tag.count_tags_bounded')
+    def __count_tags_bounded(self, iter_texts, max_tags):
+        """
+        有界内存的两遍统计，标签表的大小不随语料增长。
+        第一遍用 Space-Saving 算法在 max_tags 个计数器内近似统计，真实次数超过 总次数 / max_tags 的标签一定在列；
+        第二遍只为其中估计次数不低于2的候选精确重新计数，次数为1的标签反正会被过滤掉。
+        文本中不同的标签不超过 max_tags 个时，结果与精确统计后过滤完全一致
+        :param iter_texts: 返回文本块迭代器的函数，两遍各调用一次
+        :param max_tags: 计数器个数，即内存上限
+        :return: {候选标签: 精确次数}，按首次出现的顺序
+        """
+        summary = SpaceSaving(max_tags)
+        for text in iter_texts():
+            for tag in self.__iter_tags(text):
+                summary.add(tag)
+        candidates = {tag for tag, count, error in summary.items() if count >= 2}
+        logger.debug(f"tags counted: {summary.total}, candidates: {len(candidates)}")
+        del summary
+
+        tags = {}
+        for text in iter_texts():
+            for tag in self.__iter_tags(text):
+                if tag in candidates:
+                    tags[tag] = tags.get(tag, 0) + 1
+        return tags
+
+    def analyse_book(self, store, book, chapters, processes=1):
+        """
+        增量分析连载的书：只统计存储中还没有的章节，各章的原始次数存入 store，
+        再对存储中全书累计的次数统一过滤，不必重新统计此前的章节。
+        结果与 analyse 各章以换行拼接成的全书文本完全一致
+        :param store: 标签存储
+        :param book: 书名
+        :param chapters: (章节名, 文本) 的可迭代对象，按章节顺序
+        :param processes: 统计新章节的进程数
+        """
+        for chapter, text in chapters:
+            if not store.has_chapter(book, chapter):
+                logger.debug(f"count tags of chapter '{chapter}'...")
+                store.add_chapter(book, chapter, self.count_tags(text, processes))
+        self.__merge_tags(store.load_counts(book))
+        self.__extract_tags()
+
+    def count_tags(self, sentence, processes=1):
+        """
+        统计文本中的原始标签次数，不做任何过滤，也不影响已有的标签
+        :param sentence: 文本
+        :param processes: 进程数，大于1时按段落分片并行统计，按分片顺序合并，结果与单进程完全一致
+        :return: {标签: 次数}，按首次出现的顺序
+        """
+        tags = {}
+        if processes == 1:
+            self.__build_tags(sentence, tags)
+            return tags
+
+        with multiprocessing.Pool(processes, initializer=_init_worker) as pool:
+            for shard_tags in pool.imap(_count_tags_shard, self.__split_shards(sentence, processes)):
+                for tag, count in shard_tags.items():
+                    tags[tag] = tags.get(tag, 0) + count
+        return tags
+
+    def __merge_tags(self, tags):
+        """累加标签次数，新标签按其在 tags 中的顺序追加"""
+        for tag, count in tags.items():
+            self.__tags[tag] = self.__tags.get(tag, 0) + count
+
+    def __extract_tags(self):
+        """过滤标签：低频词、停用词、冗余词"""
         logger.debug(f"tags count before extract: {len(self.__tags)}")
         self.__remove_low_freq_tags()
         self.__remove_stop_word_tags()
         self.__remove_stop_regexps()
-        self.__remove_redundant_tags()
-        self.__remove_redundant_tags()
+        index = self.__build_containment_index()
+        self.__remove_redundant_tags(index)
+        self.__remove_redundant_tags(index)
         self.__remove_low_freq_tags()
         logger.debug(f"tags count after extract: {len(self.__tags)}")
 
-    def __build_tags(self, sentence):
+    def __split_shards(self, sentence, processes=None):
+        """
+        将文本按段落切成分片，不会切断任何片段
+        :return: 分片的迭代器
+        """
+        shard_size = max(self.MIN_SHARD_SIZE, len(sentence) // ((processes or os.cpu_count() or 1) * 4))
+        return jamen_utils.split_shards(sentence, self.__re_block, shard_size)
+
+    @profile('tag.build_tags', items=lambda result, self, sentence, tags: len(sentence))
+    def __build_tags(self, sentence, tags):
+        """
+        统计标签次数
+        :param sentence: 文本
+        :param tags: 累加次数的字典
+        """
+        for tag in self.__iter_tags(sentence):
+            tags[tag] = tags.get(tag, 0) + 1
+
+    def __iter_tags(self, sentence):
+        """
+        列举文本中每一次出现的标签：英文单词及未收录词
+        :return: 标签的迭代器
+        """
         clips = self.__re_block.split(sentence)  # 切分成不包含标点的片段
         for clip in clips:
             if not clip:
@@ -103,63 +228,48 @@ class TagAnalyzer:
 
             if self.__re_eng.match(clip):
                 # 英文单词，直接入标签
-                self.__add_tag(clip)
+                if len(clip) >= self.MIN_HAN_WORD_LENGTH:
+                    yield clip
                 continue
 
             if self.__re_han.match(clip):
-                self.__extract_words(clip)
+                yield from self.__extract_words(clip)
 
     def __extract_words(self, clip):
-        i = 0
+        """
+        找出片段中的词典词，词典词之间未收录的部分交给 __extract_not_included_words。
+        从左到右在每个位置上沿字典树前行，取以此开头的最长词典词，词长有上限，整个片段线性时间
+        :param clip: 中文片段
+        :return: 未收录词的迭代器
+        """
+        match_longest = self.__dict.match_longest
+        i = j = 0
         block_length = len(clip)
-        while i < block_length:
-            step_i = 1
-
-            j = i
-            word = None
-            while j < block_length:
-                step_j = 1
-
-                frags = {}
-                for l in range(self.MIN_HAN_WORD_LENGTH, block_length - j + 1):
-                    frag = clip[j:j + l]
-                    weight = self.__dict.get(frag, -1)
-                    if weight < 0:
-                        break
-                    frags[frag] = weight
-                for frag, weight in sorted(frags.items(), key=lambda x: x[1] * 100 + len(x[0]), reverse=True):
-                    # 按权重再词长倒序（关键）查找
-                    if weight > 0:
-                        word = frag
-                        break
-
-                if word:
-                    # self.__add_tag(word)
-                    if j > i:
-                        self.__extract_not_included_words(clip[i:j])
-                    step_i = j - i + len(word)
-                    break
-
-                j += step_j
-
-            if not word:
-                self.__extract_not_included_words(clip[i:block_length])
-                step_i = block_length - i
-
-            i += step_i
+        while j < block_length:
+            end = match_longest(clip, j)
+            if end < 0:
+                j += 1
+                continue
+            if j > i:
+                yield from self.__extract_not_included_words(clip[i:j])
+            i = j = end
+
+        if i < block_length:
+            yield from self.__extract_not_included_words(clip[i:block_length])
 
     def __extract_not_included_words(self, clip):
         """
         收集未收录词
         :param clip:
-        :return:
+        :return: 未收录词的迭代器
         """
         # if len(clip) > 1:
         #     print(str([x for x in self.__stop_regex.split(clip) if x]) + "\t" + clip)
         for frag in self.__stop_regex.split(clip):
             if len(frag) >= self.MIN_HAN_WORD_LENGTH:
-                self.__add_tag(frag)
+                yield frag
 
+    @profile('tag.remove_low_freq_tags')
     def __remove_low_freq_tags(self):
         """
         移除低频词
@@ -171,6 +281,7 @@ class TagAnalyzer:
                 self.__remove_tag(tag)
         logger.debug(f"remove low freq tags done, tags: {len(self.__tags)}")
 
+    @profile('tag.remove_stop_word_tags')
     def __remove_stop_word_tags(self):
         """
         移除停用词
@@ -182,6 +293,7 @@ class TagAnalyzer:
                 self.__remove_tag(tag)
         logger.debug(f"remove stop word tags done, tags: {len(self.__tags)}")
 
+    @profile('tag.remove_stop_regexps')
     def __remove_stop_regexps(self):
         """
         移除停用词
@@ -193,9 +305,28 @@ class TagAnalyzer:
                 self.__remove_tag(tag)
         logger.debug(f"remove stop regexps done, tags: {len(self.__tags)}")
 
-    def __remove_redundant_tags(self):
+    @profile('tag.build_containment_index')
+    def __build_containment_index(self):
+        """
+        构建标签间的包含关系索引。用标签构建多模式匹配自动机，每个标签扫描一遍即找出其包含的所有标签，
+        不必枚举其所有子串再逐一查表。此后标签只会被移除或累加次数，子标签必在此时的标签集中，
+        索引构建一次，去除冗余词的两遍共用
+        :return: {标签: 子标签列表}，子标签的次序与 list_sub_words 相同，重复出现的重复列出，标签本身也算在内
+        """
+        sub_tags = {tag: tag for tag in self.__tags if self.MIN_HAN_WORD_LENGTH <= len(tag) <= self.MAX_HAN_WORD_LENGTH}
+        automaton = AhoCorasick(sub_tags)
+        index = {}
+        for tag in self.__tags:
+            spans = sorted(automaton.finditer(tag))
+            if spans:
+                index[tag] = [sub_tags[tag[begin:end]] for begin, end in spans]
+        return index
+
+    @profile('tag.remove_redundant_tags')
+    def __remove_redundant_tags(self, index):
         """
         去除被包含的冗余词
+        :param index: 标签间的包含关系索引，只访问真正包含在标签中的子标签
         :return:
         """
         logger.debug("remove redundant tags...")
@@ -203,7 +334,7 @@ class TagAnalyzer:
         # 分离：如“秦海”出现100，“秦海道”出现20次，则长的词语便是无效的，频率差一定系数以下可分离，并将长词次数累加到短词上
         tag_counts = sorted(self.__tags.items(), key=lambda x: x[1] * 1000 - len(x[0]), reverse=True)
         for tag, tag_count in tag_counts:
-            for sub_tag in self.list_sub_words(tag):
+            for sub_tag in index.get(tag, ()):
                 sub_tag_count = self.__tags.get(sub_tag, 0)
                 if tag_count < sub_tag_count * 0.1:
                     # 被粘上的杂词
@@ -230,10 +361,6 @@ class TagAnalyzer:
     def get_tag_count(self, tag):
         return self.__tags.get(tag, 0)
 
-    def __add_tag(self, tag):
-        if len(tag) >= self.MIN_HAN_WORD_LENGTH:
-            self.__tags[tag] = self.__tags.get(tag, 0) + 1
-
     def __set_tag(self, tag, count):
         self.__tags[tag] = max(0, count)
 
@@ -241,6 +368,19 @@ class TagAnalyzer:
         self.__tags.pop(tag, None)
 
 
+_worker_analyzer = None
+"""工作进程内的分析器"""
+
+
+def _init_worker():
+    global _worker_analyzer
+    _worker_analyzer = TagAnalyzer()
+
+
+def _count_tags_shard(shard):
+    return _worker_analyzer.count_tags(shard)
+
+
 if __name__ == '__main__':
     begin_time = time.perf_counter()
     cutter = TagAnalyzer()
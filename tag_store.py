@@ -0,0 +1,98 @@
+"""
+标签次数的持久化存储
+"""
+import logging
+import os
+import sqlite3
+
+import jamen_utils
+
+logger = logging.getLogger(__name__)
+
+
+class TagStore:
+    """
+    按书、章节存放原始标签次数的 SQLite 存储。
+
+    连载中的书每次只需统计新增的章节，全书的次数由各章累加得出。
+    章节按首次存入的顺序编号，章内的标签按首次出现的顺序编号，
+    累加时按此顺序排列，与一次统计全书得到的标签顺序一致
+    """
+
+    def __init__(self, path):
+        """
+        :param path: 数据库文件路径
+        """
+        dir_path = os.path.dirname(path)
+        if dir_path:
+            jamen_utils.makesure_dir(dir_path)
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS chapters (
+                book TEXT NOT NULL,
+                chapter TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                PRIMARY KEY (book, chapter)
+            );
+            CREATE TABLE IF NOT EXISTS tag_counts (
+                book TEXT NOT NULL,
+                chapter_seq INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                tag TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (book, chapter_seq, seq)
+            );
+        ''')
+
+    def close(self):
+        self._conn.close()
+
+    def has_chapter(self, book, chapter):
+        return self._conn.execute('SELECT 1 FROM chapters WHERE book = ? AND chapter = ?',
+                                  (book, chapter)).fetchone() is not None
+
+    def chapters(self, book):
+        """
+        :return: 已存入的章节名列表，按存入的顺序
+        """
+        return [row[0] for row in self._conn.execute('SELECT chapter FROM chapters WHERE book = ? ORDER BY seq',
+                                                     (book,))]
+
+    def add_chapter(self, book, chapter, tags):
+        """
+        存入一章的原始标签次数，章节已存在时替换其次数，保留其顺序
+        :param book: 书名
+        :param chapter: 章节名
+        :param tags: {标签: 次数}，按首次出现的顺序
+        """
+        with self._conn:
+            row = self._conn.execute('SELECT seq FROM chapters WHERE book = ? AND chapter = ?',
+                                     (book, chapter)).fetchone()
+            if row:
+                chapter_seq = row[0]
+                self._conn.execute('DELETE FROM tag_counts WHERE book = ? AND chapter_seq = ?', (book, chapter_seq))
+            else:
+                chapter_seq = self._conn.execute('SELECT COALESCE(MAX(seq) + 1, 0) FROM chapters WHERE book = ?',
+                                                 (book,)).fetchone()[0]
+                self._conn.execute('INSERT INTO chapters (book, chapter, seq) VALUES (?, ?, ?)',
+                                   (book, chapter, chapter_seq))
+            self._conn.executemany('INSERT INTO tag_counts (book, chapter_seq, seq, tag, count) VALUES (?, ?, ?, ?, ?)',
+                                   ((book, chapter_seq, seq, tag, count)
+                                    for seq, (tag, count) in enumerate(tags.items())))
+        logger.debug(f"chapter '{chapter}' of book '{book}' stored, tags: {len(tags)}")
+
+    def load_counts(self, book):
+        """
+        累加全书各章的原始标签次数
+        :return: {标签: 次数}，按章节顺序、章内首次出现的顺序排列
+        """
+        tags = {}
+        for tag, count in self._conn.execute('SELECT tag, count FROM tag_counts WHERE book = ? '
+                                             'ORDER BY chapter_seq, seq', (book,)):
+            tags[tag] = tags.get(tag, 0) + count
+        return tags
+
+    def remove_book(self, book):
+        with self._conn:
+            self._conn.execute('DELETE FROM tag_counts WHERE book = ?', (book,))
+            self._conn.execute('DELETE FROM chapters WHERE book = ?', (book,))